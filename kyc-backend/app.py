@@ -1,20 +1,49 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
+import cache
 import db
+import fileserve
+import importer
+import jobs
+import json_provider
+import metrics
+import previews
+import profiling
 import reports
+import security
+import uploads
 import os
 import base64
+import hashlib
 import time
-import werkzeug.utils
+import werkzeug.security
 import datetime
 
 app = Flask(__name__)
+app.json = json_provider.FastJSONProvider(app)
 CORS(app)
+app.config['USE_X_SENDFILE'] = fileserve.SENDFILE_MODE == 'x-sendfile'
+# Werkzeug refuses bodies over this before spooling them, chunked ones included;
+# /admin/import/<dataset> raises it for its own request
+app.config['MAX_CONTENT_LENGTH'] = uploads.MAX_REQUEST_BYTES
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+UPLOAD_FOLDER = uploads.UPLOAD_DIR
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Decision letters are rendered off the request thread (KYC_JOBS_INLINE=1 renders them synchronously)
+pdf_jobs = jobs.JobQueue(
+    workers=int(os.environ.get('KYC_PDF_WORKERS', 2)),
+    max_retries=int(os.environ.get('KYC_PDF_RETRIES', 3)),
+    inline=os.environ.get('KYC_JOBS_INLINE', '0') == '1'
+)
+# Bulk imports: one at a time; a retry resumes from the import's checkpoint
+import_jobs = jobs.JobQueue(
+    workers=1,
+    max_retries=int(os.environ.get('KYC_IMPORT_RETRIES', 2)),
+    inline=os.environ.get('KYC_JOBS_INLINE', '0') == '1'
+)
+
 # Helper for simple token
 def generate_token(role, username, user_id):
     token_str = f"{role}:{username}:{user_id}:{time.time()}"
@@ -31,22 +60,201 @@ def parse_token(token):
     except:
         return None, None, None
 
-def require_auth(role_required=None):
+class AuthContext:
+    """The caller of the current request, resolved once and kept on flask.g."""
+
+    def __init__(self, role, username, user_id, kyc_status):
+        self.role = role
+        self.username = username
+        self.user_id = user_id
+        self.kyc_status = kyc_status
+
+    # Endpoints use user_info['user_id'] style access
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+def current_auth():
+    if 'auth' not in g:
+        g.auth = resolve_auth()
+    return g.auth
+
+def resolve_auth():
     auth_header = request.headers.get('Authorization')
-    if not auth_header: return False
+    if not auth_header: return None
     token = auth_header.split(" ")[1] if " " in auth_header else auth_header
     role, username, user_id = parse_token(token)
-    if not role: return False
+    if not role: return None
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return None
+    # Role and KYC status come from the (cached) USERS row, so a deleted admin or a
+    # changed KYC decision takes effect even for tokens issued earlier
+    user = db.get_user_auth(user_id)
+    if not user or user['role'] != role: return None
+    return AuthContext(role, username, user_id, user['kyc_status'])
+
+def require_auth(role_required=None):
+    auth = current_auth()
+    if not auth: return False
     if role_required:
-        if role == 'super_admin': pass # Super admin can access everything
-        elif role != role_required: return False
-    return {"role": role, "username": username, "user_id": int(user_id)}
+        if auth.role == 'super_admin': pass # Super admin can access everything
+        elif auth.role != role_required: return False
+    return auth
+
+# --- PAGINATION ---
+# List endpoints accept ?limit=N&cursor=X. Without either they return every row as before.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+def decode_cursor(cursor):
+    return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+def page_args():
+    """Returns (after_id, limit) from the query string, or raises ValueError."""
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+    limit = min(max(int(limit or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    after_id = decode_cursor(cursor) if cursor else None
+    return after_id, limit
+
+def to_columnar(rows):
+    # ?format=columnar: column names once, then one array of values per row
+    columns = list(rows[0].keys()) if rows else []
+    return {"columns": columns, "rows": [[row[c] for c in columns] for row in rows]}
+
+def paged_response(fetch, id_key):
+    # fetch(after_id, limit) runs the keyset query; one extra row tells us if there is a next page
+    try:
+        after_id, limit = page_args()
+    except Exception:
+        return jsonify({"success": False, "message": "Invalid limit or cursor"}), 400
+    columnar = request.args.get('format') == 'columnar'
+    if limit is None:
+        rows = fetch(None, None)
+        return jsonify({"success": True, "data": to_columnar(rows) if columnar else rows, "next_cursor": None})
+    rows = fetch(after_id, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][id_key])
+    return jsonify({"success": True, "data": to_columnar(rows) if columnar else rows, "next_cursor": next_cursor})
+
+# --- METRICS ---
+# Latency and status per route template (e.g. /admin/documents/<int:document_id>),
+# so ids in URLs don't explode the number of series. Not installed with KYC_METRICS=0.
+METRICS_TOKEN = os.environ.get('KYC_METRICS_TOKEN')
+
+def _record_request(status):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_DURATION.observe(time.perf_counter() - start, request.method, route)
+    metrics.HTTP_REQUESTS.inc(request.method, route, str(status))
+
+if metrics.ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        _record_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(error):
+        # Only still pending when the view raised (after_request never ran)
+        if error is not None:
+            _record_request(500)
+
+# --- PROFILING ---
+# KYC_PROFILING=1 lets an admin profile one request by sending "X-KYC-Profile: 1",
+# and profiles every request under KYC_PROFILE_PATHS; see profiling.py.
+def _finish_profile(status):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return None
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    try:
+        return profiling.stop(profile, request.method, request.path, route, status)
+    except Exception as e:
+        print(f"Error saving profile: {e}")
+        return None
+
+if profiling.ENABLED:
+    @app.before_request
+    def start_profile():
+        if request.path.startswith(profiling.PROFILE_PATHS):
+            g.profile = profiling.start()
+        elif request.headers.get(profiling.HEADER) == '1':
+            # Only admins may ask: a profiled request costs noticeably more
+            auth = current_auth()
+            if auth and auth.role in ('admin', 'super_admin'):
+                g.profile = profiling.start()
+
+    @app.after_request
+    def save_profile(response):
+        profile_id = _finish_profile(response.status_code)
+        if profile_id:
+            response.headers['X-KYC-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def save_failed_profile(error):
+        # Only still running when the view raised (after_request never ran)
+        if error is not None:
+            _finish_profile(500)
+
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({"success": False, "message": "File too large"}), 413
+
+def server_busy():
+    # Password hashing pool is saturated; ask the client to retry shortly
+    return jsonify({"success": False, "message": "Server busy, please try again"}), 503, {"Retry-After": "1"}
+
+# --- RESPONSE CACHE ---
+# Admin lists and stats are cached per URL together with the db.table_versions() they
+# were built from. While no write has bumped those tables the cached body is reused,
+# and a client presenting its ETag gets a 304. The TTL bounds how long writes made
+# by other worker processes (which don't bump our counters) can go unseen.
+RESPONSE_CACHE_TTL = float(os.environ.get('KYC_RESPONSE_CACHE_TTL', 30))
+_response_cache = cache.TTLCache(max_size=256, ttl=RESPONSE_CACHE_TTL)
+
+def cached_json(tables, build):
+    key = request.full_path
+    versions = db.table_versions(*tables)
+    entry = _response_cache.get(key)
+    if entry is None or entry[0] != versions:
+        response = build()
+        if not isinstance(response, Response) or response.status_code != 200:
+            return response
+        body = response.get_data()
+        entry = (versions, hashlib.sha1(body).hexdigest(), body)
+        _response_cache.set(key, entry)
+
+    response = Response(entry[2], mimetype='application/json')
+    # ETag is a hash of the body, so it stays valid across processes and restarts
+    response.set_etag(entry[1])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/register', methods=['POST'])
 def register():
     data = request.json
     # Expected: first, last, email, phone, dob, password
-    success = db.register_user(data['first_name'], data['last_name'], data['email'], data['phone'], data.get('dob'), data['password'])
+    try:
+        success = db.register_user(data['first_name'], data['last_name'], data['email'], data['phone'], data.get('dob'), data['password'])
+    except security.HashingBusy:
+        return server_busy()
     if success:
         return jsonify({"success": True, "message": "Registered successfully. Please wait for verification."})
     return jsonify({"success": False, "message": "Email already exists or error occured."}), 400
@@ -65,7 +273,10 @@ def login():
     if '@' not in email and email != 'super':  # Allow 'super' for super admin
         return jsonify({"success": False, "message": "Invalid email format"}), 400
     
-    user = db.login_user(email, password)
+    try:
+        user = db.login_user(email, password)
+    except security.HashingBusy:
+        return server_busy()
     if user:
         token = generate_token(user['role'], user['name'], user['id'])
         return jsonify({"success": True, "token": token, "user": user})
@@ -74,14 +285,16 @@ def login():
 @app.route('/super/admins', methods=['GET'])
 def get_admins():
     if not require_auth('super_admin'): return jsonify({"success": False}), 403
-    admins = db.get_all_admins()
-    return jsonify({"success": True, "data": admins})
+    return cached_json(("USERS",), lambda: paged_response(lambda after_id, limit: db.get_all_admins(after_id=after_id, limit=limit), 'id'))
 
 @app.route('/super/add-admin', methods=['POST'])
 def add_admin():
     if not require_auth('super_admin'): return jsonify({"success": False}), 403
     data = request.json
-    success = db.create_admin(data['first_name'], data['last_name'], data['email'], data['password'])
+    try:
+        success = db.create_admin(data['first_name'], data['last_name'], data['email'], data['password'])
+    except security.HashingBusy:
+        return server_busy()
     return jsonify({"success": success})
 
 @app.route('/super/delete-admin', methods=['POST'])
@@ -96,52 +309,114 @@ def upload_document():
     user_info = require_auth('customer')
     if not user_info: return jsonify({"success": False}), 403
     
-    if 'file' not in request.files: return jsonify({"success": False, "message": "No file"}), 400
-    file = request.files['file']
     doc_type = request.form.get('doc_type')
     doc_number = request.form.get('doc_number')
     expiry = request.form.get('expiry')
-    
-    if file:
-        filename = werkzeug.utils.secure_filename(f"{user_info['user_id']}_{doc_type}_{file.filename}")
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+    upload_id = request.form.get('upload_id')
+
+    # Either a plain multipart file, or a finished resumable session (see /upload-document/sessions)
+    try:
+        if upload_id:
+            filename = uploads.finish_session(upload_id, user_info['user_id'])
+        elif request.files.get('file'):
+            file = request.files['file']
+            filename = uploads.store_stream(file.stream, file.filename)
+        else:
+            return jsonify({"success": False, "message": "No file"}), 400
+    except uploads.UploadTooLarge as e:
+        return jsonify({"success": False, "message": str(e)}), 413
+    except uploads.UploadError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
         
-        # Save to DB
-        # Store relative path or just filename. Storing filename for simplicity.
-        success, error_msg = db.upload_document(user_info['user_id'], doc_type, doc_number, expiry, filename)
-        if success:
-            return jsonify({"success": True})
+    # Save to DB: the content-addressed path relative to the uploads folder
+    success, error_msg = db.upload_document(user_info['user_id'], doc_type, doc_number, expiry, filename)
+    if success:
+        return jsonify({"success": True})
     return jsonify({"success": False, "message": f"Upload failed: {error_msg}"})
 
+@app.route('/upload-document/sessions', methods=['POST'])
+def start_upload_session():
+    user_info = require_auth('customer')
+    if not user_info: return jsonify({"success": False}), 403
+    data = request.json or {}
+    try:
+        session = uploads.start_session(user_info['user_id'], data.get('filename', ''), int(data.get('size', 0)))
+    except (ValueError, TypeError):
+        return jsonify({"success": False, "message": "Invalid size"}), 400
+    except uploads.UploadTooLarge as e:
+        return jsonify({"success": False, "message": str(e)}), 413
+    return jsonify({"success": True, "data": session})
+
+@app.route('/upload-document/sessions/<upload_id>', methods=['GET', 'PUT'])
+def upload_session(upload_id):
+    # PUT ?offset=N with the raw chunk as the body; GET tells a client where to resume
+    user_info = require_auth('customer')
+    if not user_info: return jsonify({"success": False}), 403
+    try:
+        if request.method == 'GET':
+            return jsonify({"success": True, "data": uploads.session_status(upload_id, user_info['user_id'])})
+        accepted, offset = uploads.append_chunk(upload_id, user_info['user_id'], int(request.args.get('offset', 0)), request.stream)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid offset"}), 400
+    except uploads.UploadTooLarge as e:
+        return jsonify({"success": False, "message": str(e)}), 413
+    except uploads.UploadError as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    if not accepted:
+        return jsonify({"success": False, "message": "Offset mismatch", "offset": offset}), 409
+    return jsonify({"success": True, "offset": offset})
+
 @app.route('/admin/verification-requests', methods=['GET'])
 def verification_requests():
     if not require_auth('admin'): return jsonify({"success": False}), 403
     show_history = request.args.get('show_history', 'false').lower() == 'true'
-    reqs = db.get_verification_requests(show_history=show_history)
-    return jsonify({"success": True, "data": reqs})
+    include_documents = request.args.get('documents', 'true').lower() != 'false'
+    return cached_json(("USERS", "DOCUMENTS"), lambda: paged_response(lambda after_id, limit: db.get_verification_requests(
+        show_history=show_history, include_documents=include_documents, after_id=after_id, limit=limit), 'user_id'))
+
+@app.route('/admin/documents/<int:document_id>', methods=['GET'])
+def document_detail(document_id):
+    # The only place a document number is decrypted; list endpoints return it masked
+    user_info = require_auth('admin')
+    if not user_info: return jsonify({"success": False}), 403
+    doc = db.get_document(document_id)
+    if not doc:
+        return jsonify({"success": False, "message": "Document not found"}), 404
+    db.log_audit(user_info['user_id'], f'view_document_{document_id}')
+    return jsonify({"success": True, "data": doc})
 
 @app.route('/admin/verify', methods=['POST'])
 def verify_user():
     user_info = require_auth('admin')
     if not user_info: return jsonify({"success": False}), 403
     data = request.json
-    success = db.verify_user_status(user_info['user_id'], data['user_id'], data['action']) 
+    success = db.verify_user_status(user_info['user_id'], data['user_id'], data['action'])
     return jsonify({"success": success})
 
+MAX_BULK_VERIFY = int(os.environ.get('KYC_MAX_BULK_VERIFY', 10000))
+
+@app.route('/admin/verify/bulk', methods=['POST'])
+def verify_users_bulk():
+    user_info = require_auth('admin')
+    if not user_info: return jsonify({"success": False}), 403
+    # Expected: {"decisions": [{"user_id": 12, "action": "approve"}, ...]}
+    decisions = (request.get_json(silent=True) or {}).get('decisions')
+    if not isinstance(decisions, list) or not decisions or not all(isinstance(d, dict) for d in decisions):
+        return jsonify({"success": False, "message": "decisions must be a non-empty list"}), 400
+    if len(decisions) > MAX_BULK_VERIFY:
+        return jsonify({"success": False, "message": f"At most {MAX_BULK_VERIFY} decisions per request"}), 400
+
+    results = db.bulk_verify_users(user_info['user_id'], [(d.get('user_id'), d.get('action')) for d in decisions])
+    updated = sum(1 for r in results if r["success"])
+    return jsonify({"success": True, "updated": updated, "failed": len(results) - updated, "results": results})
+
 @app.route('/customer/apply-loan', methods=['POST'])
 def apply_loan():
     user_info = require_auth('customer')
     if not user_info: return jsonify({"success": False}), 403
     
-    # Check if verified
-    conn = db.connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT kyc_status FROM USERS WHERE user_id = ?", (user_info['user_id'],))
-    row = cursor.fetchone()
-    conn.close()
-    
-    if not row or row[0] != 'verified':
+    # Check if verified (resolved with the caller, no extra query)
+    if user_info.kyc_status != 'verified':
         return jsonify({"success": False, "message": "KYC Verification required"}), 403
 
     data = request.json
@@ -153,15 +428,14 @@ def customer_loans():
     user_info = require_auth('customer')
     if not user_info: return jsonify({"success": False}), 403
     
-    loans = db.get_customer_loans(user_info['user_id'])
-    return jsonify({"success": True, "data": loans})
+    return paged_response(lambda after_id, limit: db.get_customer_loans(user_info['user_id'], after_id=after_id, limit=limit), 'loan_id')
 
 
 @app.route('/admin/loan-requests', methods=['GET'])
 def loan_requests():
     if not require_auth('admin'): return jsonify({"success": False}), 403
-    requests = db.get_all_loan_requests(status_filter='pending')
-    return jsonify({"success": True, "data": requests})
+    return cached_json(("LOAN_APPLICATIONS", "USERS"), lambda: paged_response(
+        lambda after_id, limit: db.get_all_loan_requests(status_filter='pending', after_id=after_id, limit=limit), 'loan_id'))
 
 @app.route('/admin/loan-decision', methods=['POST'])
 def loan_decision():
@@ -182,135 +456,220 @@ def loan_decision():
     loan_details['decided_at'] = datetime.datetime.now().strftime("%Y-%m-%d")
     loan_details['notes'] = data.get('notes', '')
 
-    # 3. Generate PDF
-    try:
-        pdf_filename = reports.generate_loan_pdf(loan_details)
-    except Exception as e:
-        return jsonify({"success": False, "message": f"PDF Error: {e}"}), 500
-
-    # 4. Update Database
+    # 3. Update Database (the letter is attached once it has been rendered)
     success = db.update_loan_decision(
         loan_id=data['loan_id'],
         decision=data['decision'],
         admin_id=user_info['user_id'],
-        pdf_path=pdf_filename,
+        pdf_path=None,
         notes=data.get('notes', '')
     )
-    
-    if success:
-        return jsonify({"success": True})
-    else:
+    if not success:
         return jsonify({"success": False, "message": "Database update failed"}), 500
 
+    # 4. Render the PDF in the background
+    loan_id = data['loan_id']
+    job_id = pdf_jobs.submit('loan_pdf', reports.generate_loan_pdf, loan_details,
+                             on_success=lambda filename: db.set_loan_pdf_path(loan_id, filename, decision_status))
+    return jsonify({"success": True, "job_id": job_id})
+
+@app.route('/admin/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    if not require_auth('admin'): return jsonify({"success": False}), 403
+    job = pdf_jobs.get(job_id) or import_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Unknown job"}), 404
+    return jsonify({"success": True, "data": job})
+
+@app.route('/admin/import/<dataset>', methods=['POST'])
+def import_data(dataset):
+    # Multipart upload of a .csv or .jsonl file (see importer.py for the columns); runs as a job
+    if not require_auth('admin'): return jsonify({"success": False}), 403
+    if dataset not in importer.DATASETS:
+        return jsonify({"success": False, "message": "Unknown dataset"}), 404
+    request.max_content_length = importer.MAX_IMPORT_BYTES + uploads.MULTIPART_OVERHEAD
+    file = request.files.get('file')
+    ext = os.path.splitext(file.filename or '')[1].lower() if file else ''
+    if ext not in importer.SOURCE_FORMATS:
+        return jsonify({"success": False, "message": "Upload a .csv or .jsonl file"}), 400
+
+    os.makedirs(importer.IMPORT_DIR, exist_ok=True)
+    path = os.path.join(importer.IMPORT_DIR, f"{dataset}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}{ext}")
+    file.save(path)
+
+    def finished(report):
+        db.refresh_after_import()
+        importer.remove_source(path)
+
+    def failed(error):
+        # Retries are spent, so the file and its checkpoint go. Rows imported before the
+        # failure stay: customers are skipped as duplicates if the file is uploaded again,
+        # loans are not deduplicated (check the job's error before re-uploading loans).
+        db.refresh_after_import()
+        importer.remove_source(path)
+    job_id = import_jobs.submit(f'import_{dataset}', importer.run_import, dataset, path, on_success=finished, on_failure=failed)
+    return jsonify({"success": True, "job_id": job_id})
+
 @app.route('/export/excel', methods=['GET'])
 def export_excel():
     if not require_auth('admin'): return jsonify({"success": False}), 403
-    verifications, loans = db.get_export_data()
-    filename = reports.generate_excel_report(verifications, loans)
+    sheets = [('Verifications', db.iter_export_rows('customers')), ('Loan Requests', db.iter_export_rows('loans'))]
+    filename = reports.generate_excel_report(sheets, watermark=db.get_export_watermark())
     return jsonify({"success": True, "download_url": f"/download-report/{filename}"})
 
 @app.route('/export/csv', methods=['GET'])
 def export_csv():
     if not require_auth('admin'): return jsonify({"success": False}), 403
     export_type = request.args.get('type')  # 'customers' or 'loans'
-    
-    verifications, loans = db.get_export_data()
-    
-    if export_type == 'customers':
-        data = verifications
-    elif export_type == 'loans':
-        data = loans
-    else:
+    if export_type not in db.EXPORT_QUERIES:
         return jsonify({"success": False, "message": "Invalid type"}), 400
+
+    # ?stream=true sends the CSV straight back as a chunked response instead of a file on disk
+    if request.args.get('stream', 'false').lower() == 'true':
+        filename = f"{export_type}_Export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        return Response(stream_with_context(reports.iter_csv(db.iter_export_rows(export_type))),
+                        mimetype='text/csv',
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
         
-    filename = reports.generate_csv_export(data, export_type)
+    filename = reports.generate_csv_export(db.iter_export_rows(export_type), export_type)
     return jsonify({"success": True, "download_url": f"/download-report/{filename}"})
 
 @app.route('/download-pdf/<filename>')
 def download_pdf(filename):
-    return send_from_directory('admin_exports', filename)
+    return fileserve.send_cached(reports.EXPORT_DIR, filename)
 
 @app.route('/download-report/<filename>')
 def download_report(filename):
-    return send_from_directory('reports', filename)
+    return fileserve.send_cached(reports.REPORT_DIR, filename)
 
 @app.route('/admin/search/users', methods=['GET'])
 def search_users():
     if not require_auth('admin'): return jsonify({"success": False}), 403
-    query = request.args.get('query', '').lower()
-    
-    all_users = db.get_verification_requests(show_history=True)
-    filtered_users = [u for u in all_users if query in u['name'].lower() or query in u['email'].lower()]
+    query = request.args.get('query', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid limit"}), 400
     
-    return jsonify({"success": True, "data": filtered_users})
+    users = db.search_users(query, limit=limit)
+    return jsonify({"success": True, "data": users})
 
 @app.route('/admin/search/loans', methods=['GET'])
 def search_loans():
     if not require_auth('admin'): return jsonify({"success": False}), 403
     status = request.args.get('status', '').lower()
     
-    all_loans = db.get_all_loan_requests()
-    if status:
-        filtered_loans = [loan for loan in all_loans if loan.get('status', '').lower() == status]
-    else:
-        filtered_loans = all_loans
-    
-    return jsonify({"success": True, "data": filtered_loans})
+    # Filter in SQL; no status means every loan
+    return paged_response(lambda after_id, limit: db.get_all_loan_requests(status_filter=status or 'all', after_id=after_id, limit=limit), 'loan_id')
+
+STATS_TABLES = ("USERS", "LOAN_APPLICATIONS")
+
+def cached_stats(build):
+    # The counters are (re)seeded from SQL aggregates; if that fails, answer 500 without a traceback
+    try:
+        return cached_json(STATS_TABLES, build)
+    except Exception as e:
+        print(f"Stats Error: {e}")
+        return jsonify({"success": False, "message": f"Stats unavailable: {e}"}), 500
+
+@app.route('/admin/stats/summary', methods=['GET'])
+def stats_summary():
+    if not require_auth('admin'): return jsonify({"success": False}), 403
+    return cached_stats(lambda: jsonify({"success": True, "data": db.get_stats_summary()}))
 
 @app.route('/admin/stats/kyc-success-rate', methods=['GET'])
 def kyc_success_rate():
     if not require_auth('admin'): return jsonify({"success": False}), 403
     
-    all_users = db.get_verification_requests(show_history=True)
-    total = len(all_users)
-    verified = len([u for u in all_users if u['status'] == 'verified'])
-    rate = (verified / total * 100) if total > 0 else 0
-    
-    return jsonify({"success": True, "rate": round(rate, 1), "verified": verified, "total": total})
+    def build():
+        kyc = db.get_stats_summary()['kyc']
+        return jsonify({"success": True, "rate": kyc['rate'], "verified": kyc['verified'], "total": kyc['total']})
+    return cached_stats(build)
 
 @app.route('/admin/stats/loan-approval-rate', methods=['GET'])
 def loan_approval_rate():
     if not require_auth('admin'): return jsonify({"success": False}), 403
     
-    all_loans = db.get_all_loan_requests()
-    total = len(all_loans)
-    approved = len([loan for loan in all_loans if loan.get('status') == 'approved'])
-    rate = (approved / total * 100) if total > 0 else 0
-    
-    return jsonify({"success": True, "rate": round(rate, 1), "approved": approved, "total": total})
+    def build():
+        loans = db.get_stats_summary()['loans']
+        return jsonify({"success": True, "rate": loans['rate'], "approved": loans['approved'], "total": loans['total']})
+    return cached_stats(build)
 
 @app.route('/admin/stats/monthly-applications', methods=['GET'])
 def monthly_applications():
     if not require_auth('admin'): return jsonify({"success": False}), 403
     
-    all_loans = db.get_all_loan_requests()
-    now = datetime.datetime.now()
-    this_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    last_month = (this_month_start - datetime.timedelta(days=1)).replace(day=1)
-    
-    this_month_count = 0
-    last_month_count = 0
-    
-    for loan in all_loans:
-        try:
-            app_date = datetime.datetime.strptime(loan.get('applied_at', ''), '%Y-%m-%d %H:%M:%S')
-            if app_date >= this_month_start:
-                this_month_count += 1
-            elif app_date >= last_month and app_date < this_month_start:
-                last_month_count += 1
-        except:
-            pass
-    
-    return jsonify({"success": True, "this_month": this_month_count, "last_month": last_month_count})
+    def build():
+        monthly = db.get_stats_summary()['monthly']
+        return jsonify({"success": True, "this_month": monthly['this_month'], "last_month": monthly['last_month']})
+    return cached_stats(build)
+
+@app.route('/admin/stats/db-pool', methods=['GET'])
+def db_pool_stats():
+    if not require_auth('admin'): return jsonify({"success": False}), 403
+    return jsonify({"success": True, "data": db.pool_stats()})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus scrape target; set KYC_METRICS_TOKEN to require "Authorization: Bearer <token>"
+    if not metrics.ENABLED:
+        return "Metrics disabled", 404
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return "Unauthorized", 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not require_auth('admin'): return jsonify({"success": False}), 403
+    return jsonify({"success": True, "enabled": profiling.ENABLED, "data": profiling.list_profiles()})
 
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    # Raw cProfile dump by default (open with snakeviz or pstats); ?format=text for the summary
+    if not require_auth('admin'): return jsonify({"success": False}), 403
+    filename = profiling.profile_filename(profile_id, request.args.get('format', 'prof'))
+    if not filename:
+        return jsonify({"success": False, "message": "Unknown profile"}), 404
+    return fileserve.send_cached(profiling.PROFILE_DIR, filename)
 
-@app.route('/uploads/<filename>')
+@app.route('/admin/stats/slow-queries', methods=['GET'])
+def slow_queries():
+    if not require_auth('admin'): return jsonify({"success": False}), 403
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid limit"}), 400
+    return jsonify({"success": True, "threshold_ms": db.SLOW_QUERY_MS, "data": db.slow_queries(limit)})
+
+def _collect_app_metrics():
+    return [
+        ("kyc_response_cache_requests_total", "counter", "Admin list/stats response cache lookups.",
+         [({"result": "hit"}, _response_cache.hits), ({"result": "miss"}, _response_cache.misses)]),
+        ("kyc_jobs", "gauge", "Tracked background jobs by queue and status.",
+         [({"queue": name, "status": status}, count)
+          for name, queue in (("pdf", pdf_jobs), ("import", import_jobs)) for status, count in queue.counts().items()]),
+    ]
+
+metrics.register_collector(_collect_app_metrics)
+
+@app.route('/uploads/<path:filename>')
 def serve_upload(filename):
     # Only admin should see uploads? Or verified user.
     # Authorization needed? For simplicity, public or check token.
     # Let's simple check token presence.
     if not request.headers.get('Authorization'): return "Unauthorized", 403
-    return send_from_directory('uploads', filename)
+
+    # ?size=thumb|medium serves a cached, downscaled JPEG instead of the original scan
+    size = request.args.get('size')
+    if size:
+        if size not in previews.SIZES:
+            return jsonify({"success": False, "message": f"size must be one of: {', '.join(previews.SIZES)}"}), 400
+        if not werkzeug.security.safe_join(UPLOAD_FOLDER, filename) or not os.path.isfile(os.path.join(UPLOAD_FOLDER, filename)):
+            return "Not Found", 404
+        preview = previews.get_preview(filename, size)
+        if preview:
+            return fileserve.send_cached(previews.PREVIEW_DIR, preview)
+    return fileserve.send_cached(UPLOAD_FOLDER, filename)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,108 @@
+import atexit
+import queue
+import threading
+import time
+
+# Background writer for AUDIT_LOG. Events are queued in memory and a daemon
+# thread inserts them with executemany, flushing when BATCH_SIZE events are
+# waiting or FLUSH_INTERVAL seconds have passed, whichever comes first.
+#
+# `write_rows(rows)` is supplied by db.py and does the actual INSERT + commit.
+
+class AuditWriter:
+    def __init__(self, write_rows, batch_size=100, flush_interval=1.0, max_queue=10000,
+                 put_timeout=0.5, sync=False):
+        self._write_rows = write_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        # Synchronous mode writes every event inline (tests, scripts)
+        self.sync = sync
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "inline_writes": 0, "failed": 0}
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def log(self, row):
+        self.log_many([row])
+
+    def log_many(self, rows):
+        if self.sync or self._stopping.is_set():
+            self._write(rows)
+            return
+        self._ensure_started()
+        for i, row in enumerate(rows):
+            try:
+                # Backpressure: the caller waits a little for room in the queue...
+                self._queue.put(row, timeout=self.put_timeout)
+                self._stats["queued"] += 1
+            except queue.Full:
+                # ...and if the writer still can't keep up, writes the rest itself
+                self._stats["inline_writes"] += len(rows) - i
+                self._write(rows[i:])
+                return
+
+    def _write(self, rows):
+        if not rows:
+            return
+        try:
+            self._write_rows(rows)
+            self._stats["written"] += len(rows)
+            self._stats["batches"] += 1
+        except Exception as e:
+            self._stats["failed"] += len(rows)
+            print(f"Audit Error: {e}")
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Give a burst a moment to accumulate before writing it
+            deadline = time.monotonic() + self.flush_interval
+            batch = [first]
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self):
+        """Write everything queued so far on the calling thread."""
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        data = dict(self._stats)
+        data["pending"] = self._queue.qsize()
+        return data
@@ -0,0 +1,574 @@
+import argparse
+import datetime
+import io
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Load-test and benchmark suite.
+#
+#   python benchmark.py seed --users 100000       # fresh SQLite DB with synthetic data
+#   python benchmark.py run --requests 200        # every route via the Flask test client
+#   python benchmark.py run --http --concurrency 16   # read routes over real HTTP
+#   python benchmark.py compare old.json new.json # p95/throughput regressions (exit 1)
+#
+# Seeding writes straight through the storage engine with executemany, so 10M rows
+# is practical: every seeded customer shares one precomputed Argon2 hash
+# (password SEED_PASSWORD) and document numbers reuse a small set of ciphertexts.
+# Row counts: --users customers, 1 document each, --loans-per-user loans,
+# --audit-per-user audit rows.
+#
+# Results are written to bench_results/<timestamp>.json: p50/p95/p99/mean latency,
+# throughput and peak RSS per endpoint, plus the git commit and settings, so two
+# runs can be compared. Runs are reproducible for a given --seed.
+#
+# The DB engine and path are read from the environment when db.py is imported, so
+# they are set here first and the app modules are imported inside the commands.
+
+BENCH_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'bench.sqlite3')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_results')
+SEED_PASSWORD = 'bench-password'
+SEED_CHUNK = 10000
+PURPOSES = ('home', 'car', 'education', 'business', 'medical', 'personal')
+FIRST_NAMES = ('John', 'Maria', 'Ahmed', 'Li', 'Sara', 'David', 'Aisha', 'Tom', 'Nina', 'Omar')
+LAST_NAMES = ('Smith', 'Khan', 'Garcia', 'Chen', 'Brown', 'Ali', 'Jones', 'Lopez', 'Kim', 'Patel')
+# 1x1 PNG, used for upload and preview benchmarks
+PNG_BYTES = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                          '1f15c4890000000d49444154789c6360f8cfc0000003010100c9fe92ef0000000049454e44ae426082')
+
+# The app's own databases (storage.py defaults): seed wipes its target and run writes to it
+APP_DATABASES = tuple(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', name) for name in ('kyc.sqlite3', 'kyc.accdb'))
+
+def _configure_env(args):
+    # --engine/--db always win: an exported KYC_DB_PATH (read_me.md suggests one) points
+    # at the real database, which must never be seeded or benchmarked by accident
+    if os.path.abspath(args.db) in APP_DATABASES:
+        raise SystemExit(f"Refusing to use the application database {args.db}; pass a dedicated --db")
+    configured = os.environ.get('KYC_DB_PATH')
+    if configured and os.path.abspath(configured) != os.path.abspath(args.db):
+        print(f"Ignoring KYC_DB_PATH={configured}; using --db {args.db}")
+    os.environ['KYC_DB_ENGINE'] = args.engine
+    os.environ['KYC_DB_PATH'] = args.db
+    # Decision letters are rendered inside the request so their cost shows up in the timings
+    os.environ.setdefault('KYC_JOBS_INLINE', '1')
+
+# --- MEMORY ---
+class RssSampler:
+    """Peak resident set size (MB) while the block runs, sampled from /proc every 10 ms.
+    Falls back to the process-wide peak from getrusage, or None where neither exists."""
+
+    def __init__(self):
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_mb():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+        except (OSError, ValueError, AttributeError):
+            pass
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+        except ImportError:
+            return None
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self._update()
+
+    def _update(self):
+        value = self.current_mb()
+        if value is not None and (self.peak_mb is None or value > self.peak_mb):
+            self.peak_mb = value
+
+    def __enter__(self):
+        self._update()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._update()
+
+# --- SEEDING ---
+def _chunks(rows, size=SEED_CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def seed(args):
+    _configure_env(args)
+    if os.environ['KYC_DB_ENGINE'] == 'sqlite':
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    import init_db
+    import security
+    init_db.init_db(reset=True)
+
+    rng = random.Random(args.seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    password_hash = security.hash_password(SEED_PASSWORD)
+    ciphertexts = [security.encrypt_value(f"P{n:08d}") for n in range(100)]
+    users = args.users
+    started = time.perf_counter()
+    counts = {}
+
+    conn = init_db.ENGINE.connect()
+    cursor = conn.cursor()
+
+    def insert(table, sql, rows):
+        count = 0
+        for chunk in _chunks(rows):
+            cursor.executemany(sql, chunk)
+            conn.commit()
+            count += len(chunk)
+        counts[table] = count
+        print(f"{table}: {count} rows ({time.perf_counter() - started:.1f}s)")
+
+    def users_rows():
+        # user_id 1 is the super admin from init_db; customers are 2..users+1
+        for i in range(users):
+            status = rng.choices(('verified', 'pending', 'rejected'), (6, 3, 1))[0]
+            yield (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"customer{i}@bench.test", f"555{i:07d}",
+                   datetime.datetime(1960, 1, 1) + datetime.timedelta(days=rng.randrange(15000)), password_hash,
+                   'customer', status, now - datetime.timedelta(minutes=rng.randrange(60 * 24 * 720)), 1)
+    insert('USERS', """INSERT INTO USERS (first_name, last_name, email, phone, date_of_birth, password_hash,
+                       user_type, kyc_status, created_at, verified_by) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", users_rows())
+
+    def document_rows():
+        for user_id in range(2, users + 2):
+            yield (user_id, rng.choice(('passport', 'national_id', 'driving_license')), rng.choice(ciphertexts),
+                   now + datetime.timedelta(days=rng.randrange(3650)), 'bench/sample.png', now, 'pending')
+    insert('DOCUMENTS', """INSERT INTO DOCUMENTS (user_id, document_type, document_number, expiry_date,
+                           document_image_path, upload_date, verification_status) VALUES (?, ?, ?, ?, ?, ?, ?)""", document_rows())
+
+    def loan_rows():
+        for _ in range(int(users * args.loans_per_user)):
+            yield (rng.randrange(2, users + 2), rng.randrange(500, 100000), rng.choice((6, 12, 24, 36, 60)),
+                   rng.choice(PURPOSES), rng.choices(('pending', 'approved', 'rejected'), (5, 3, 2))[0],
+                   now - datetime.timedelta(minutes=rng.randrange(60 * 24 * 720)))
+    insert('LOAN_APPLICATIONS', """INSERT INTO LOAN_APPLICATIONS (user_id, loan_amount, tenure_months, loan_purpose,
+                                   application_status, application_date) VALUES (?, ?, ?, ?, ?, ?)""", loan_rows())
+
+    def audit_rows():
+        for _ in range(int(users * args.audit_per_user)):
+            user_id = rng.randrange(2, users + 2)
+            yield (user_id, rng.choice(('login', 'signup', 'loan_request', 'upload_document')),
+                   now - datetime.timedelta(seconds=rng.randrange(86400 * 720)), '127.0.0.1')
+    insert('AUDIT_LOG', "INSERT INTO AUDIT_LOG (user_id, action, action_timestamp, ip_address) VALUES (?, ?, ?, ?)", audit_rows())
+    init_db.ENGINE.analyze(conn)
+    conn.close()
+
+    seconds = time.perf_counter() - started
+    print(f"Seeded {sum(counts.values())} rows in {seconds:.1f}s")
+    return {"counts": counts, "seconds": round(seconds, 2), "seed": args.seed}
+
+# --- ENDPOINTS ---
+class Context:
+    """Ids and tokens the endpoint specs need; filled in by prepare()."""
+
+    def __init__(self, appmod, rng):
+        self.app = appmod
+        self.rng = rng
+        self.super_token = appmod.generate_token('super_admin', 'Super Admin', 1)
+        self.seeded_customers = 1
+        self.customer_id = None
+        self.customer_token = None
+        self.max_user_id = None
+        self.pending_loans = []
+        self.document_id = None
+        self.upload_path = None
+        self.pdf_file = None
+        self.report_file = None
+        self.job_id = None
+        self.profile_id = None
+        self.counter = 0
+
+    def unique(self):
+        self.counter += 1
+        return f"{os.getpid()}_{time.time_ns()}_{self.counter}"
+
+    def next_pending_loan(self):
+        return self.pending_loans.pop() if self.pending_loans else 0
+
+def prepare(ctx, client):
+    import db
+    conn = db.connect_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(user_id) FROM USERS")
+        ctx.max_user_id = cursor.fetchone()[0] or 1
+        cursor.execute("SELECT COUNT(*) FROM USERS WHERE email LIKE 'customer%@bench.test'")
+        ctx.seeded_customers = cursor.fetchone()[0] or 1
+        cursor.execute(db.ENGINE.limit("SELECT user_id, first_name FROM USERS WHERE user_type = 'customer' AND kyc_status = 'verified' ORDER BY user_id", 1))
+        row = cursor.fetchone()
+        if not row:
+            raise SystemExit("No verified customer found; run `python benchmark.py seed` first")
+        ctx.customer_id = row[0]
+        ctx.customer_token = ctx.app.generate_token('customer', row[1], row[0])
+        cursor.execute(db.ENGINE.limit("SELECT loan_id FROM LOAN_APPLICATIONS WHERE application_status = 'pending' ORDER BY loan_id DESC", 5000))
+        ctx.pending_loans = [r[0] for r in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    headers = {"Authorization": f"Bearer {ctx.customer_token}"}
+    admin = {"Authorization": f"Bearer {ctx.super_token}"}
+    client.post('/upload-document', headers=headers, content_type='multipart/form-data',
+                data={"doc_type": "passport", "doc_number": "P1234567", "expiry": "2030-01-01", "file": (io.BytesIO(PNG_BYTES), 'bench.png')})
+    docs = db.get_user_documents(ctx.customer_id)
+    ctx.document_id = docs[-1]["document_id"]
+    ctx.upload_path = docs[-1]["path"]
+    result = client.post('/admin/loan-decision', headers=admin, json={"loan_id": ctx.next_pending_loan(), "decision": "approve"}).get_json()
+    ctx.job_id = result.get("job_id")
+    job = ctx.app.pdf_jobs.get(ctx.job_id) if ctx.job_id else None
+    ctx.pdf_file = job["result"] if job else None
+    url = client.get('/export/excel', headers=admin).get_json().get("download_url", "")
+    ctx.report_file = url.rsplit('/', 1)[-1]
+    if ctx.app.profiling.ENABLED:
+        r = client.get('/admin/stats/db-pool', headers={**admin, ctx.app.profiling.HEADER: '1'})
+        ctx.profile_id = r.headers.get('X-KYC-Profile-Id')
+
+def _search_term(ctx, i):
+    return f"customer{i % min(ctx.seeded_customers, 100)}"
+
+def _upload_form(ctx, i):
+    return {"content_type": 'multipart/form-data',
+            "data": {"doc_type": "passport", "doc_number": f"B{i:07d}", "expiry": "2030-01-01",
+                     "file": (io.BytesIO(PNG_BYTES + ctx.unique().encode()), 'bench.png')}}
+
+def _start_session(ctx, client):
+    r = client.post('/upload-document/sessions', headers={"Authorization": f"Bearer {ctx.customer_token}"},
+                    json={"filename": "scan.png", "size": len(PNG_BYTES)})
+    return r.get_json()["data"]["upload_id"]
+
+def _admin_pair(ctx, client):
+    # delete-admin needs an admin to delete: create one per iteration
+    email = f"admin_{ctx.unique()}@bench.test"
+    admin = {"Authorization": f"Bearer {ctx.super_token}"}
+    client.post('/super/add-admin', headers=admin, json={"first_name": "Bench", "last_name": "Admin", "email": email, "password": "pw"})
+    import db
+    conn = db.connect_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM USERS WHERE email = ?", (email,))
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+# (name, method, path, role, request kwargs, http) -- path and kwargs may be callables of (ctx, i);
+# role is 'super', 'customer' or None; http=False keeps an endpoint out of the HTTP load run
+# (multipart bodies and writes that depend on per-iteration state set up through the test client)
+ENDPOINTS = [
+    ("register", "POST", "/register", None,
+     lambda ctx, i: {"json": {"first_name": "Bench", "last_name": "User", "email": f"reg_{ctx.unique()}@bench.test",
+                              "phone": "555", "dob": "1990-01-01", "password": "bench-pw"}}, False),
+    ("login", "POST", "/login", None,
+     lambda ctx, i: {"json": {"email": f"customer{i % min(ctx.seeded_customers, 1000)}@bench.test", "password": SEED_PASSWORD}}, True),
+    ("super_admins", "GET", "/super/admins", 'super', None, True),
+    ("super_add_admin", "POST", "/super/add-admin", 'super',
+     lambda ctx, i: {"json": {"first_name": "Bench", "last_name": "Admin", "email": f"admin_{ctx.unique()}@bench.test", "password": "pw"}}, False),
+    ("super_delete_admin", "POST", "/super/delete-admin", 'super', "admin_pair", False),
+    ("upload_document", "POST", "/upload-document", 'customer', _upload_form, False),
+    ("upload_session_start", "POST", "/upload-document/sessions", 'customer',
+     lambda ctx, i: {"json": {"filename": "scan.png", "size": len(PNG_BYTES)}}, True),
+    ("upload_session_status", "GET", lambda ctx, i: f"/upload-document/sessions/{ctx.session_id}", 'customer', "session", False),
+    ("upload_session_chunk", "PUT", lambda ctx, i: f"/upload-document/sessions/{ctx.session_id}?offset=0", 'customer', "session_chunk", False),
+    ("verification_requests", "GET", "/admin/verification-requests?limit=50", 'super', None, True),
+    ("verification_requests_history", "GET", "/admin/verification-requests?show_history=true&limit=500&format=columnar", 'super', None, True),
+    ("document_detail", "GET", lambda ctx, i: f"/admin/documents/{ctx.document_id}", 'super', None, True),
+    ("verify", "POST", "/admin/verify", 'super',
+     lambda ctx, i: {"json": {"user_id": ctx.rng.randrange(2, ctx.max_user_id + 1), "action": "approve" if i % 2 else "reject"}}, True),
+    ("verify_bulk", "POST", "/admin/verify/bulk", 'super',
+     lambda ctx, i: {"json": {"decisions": [{"user_id": ctx.rng.randrange(2, ctx.max_user_id + 1), "action": "approve"} for _ in range(100)]}}, True),
+    ("apply_loan", "POST", "/customer/apply-loan", 'customer',
+     lambda ctx, i: {"json": {"amount": 1000 + i, "term": 12, "purpose": "car"}}, True),
+    ("customer_loans", "GET", "/customer/loans", 'customer', None, True),
+    ("loan_requests", "GET", "/admin/loan-requests?limit=50", 'super', None, True),
+    ("loan_decision", "POST", "/admin/loan-decision", 'super',
+     lambda ctx, i: {"json": {"loan_id": ctx.next_pending_loan(), "decision": "approve" if i % 2 else "reject"}}, False),
+    ("job_status", "GET", lambda ctx, i: f"/admin/jobs/{ctx.job_id}", 'super', None, True),
+    ("import_loans", "POST", "/admin/import/loans", 'super',
+     lambda ctx, i: {"content_type": 'multipart/form-data',
+                     "data": {"file": (io.BytesIO(b"email,amount,term,purpose\ncustomer0@bench.test,1000,12,car\n"), 'loans.csv')}}, False),
+    ("export_excel", "GET", "/export/excel", 'super', None, True),
+    ("export_csv", "GET", "/export/csv?type=loans", 'super', None, True),
+    ("export_csv_stream", "GET", "/export/csv?type=customers&stream=true", 'super', None, True),
+    ("download_pdf", "GET", lambda ctx, i: f"/download-pdf/{ctx.pdf_file}", 'super', None, True),
+    ("download_report", "GET", lambda ctx, i: f"/download-report/{ctx.report_file}", 'super', None, True),
+    ("search_users", "GET", lambda ctx, i: f"/admin/search/users?query={_search_term(ctx, i)}", 'super', None, True),
+    ("search_loans", "GET", "/admin/search/loans?status=approved&limit=100", 'super', None, True),
+    ("stats_summary", "GET", "/admin/stats/summary", 'super', None, True),
+    ("stats_kyc_success_rate", "GET", "/admin/stats/kyc-success-rate", 'super', None, True),
+    ("stats_loan_approval_rate", "GET", "/admin/stats/loan-approval-rate", 'super', None, True),
+    ("stats_monthly_applications", "GET", "/admin/stats/monthly-applications", 'super', None, True),
+    ("stats_db_pool", "GET", "/admin/stats/db-pool", 'super', None, True),
+    ("serve_upload", "GET", lambda ctx, i: f"/uploads/{ctx.upload_path}", 'super', None, True),
+    ("serve_upload_thumb", "GET", lambda ctx, i: f"/uploads/{ctx.upload_path}?size=thumb", 'super', None, True),
+    ("stats_slow_queries", "GET", "/admin/stats/slow-queries", 'super', None, True),
+    ("list_profiles", "GET", "/admin/profiles", 'super', None, True),
+    ("download_profile", "GET", lambda ctx, i: f"/admin/profiles/{ctx.profile_id}?format=text", 'super', None, True),
+    ("metrics", "GET", "/metrics", None, None, True),
+]
+
+# Checks on each endpoint's first response. An empty or unrelated answer means the spec no
+# longer matches the route (e.g. a renamed query parameter) and would time a no-op.
+EXPECT_RESULTS = {
+    "search_users": lambda ctx, i, data: bool(data) and all(_search_term(ctx, i) in u["email"] for u in data),
+    "search_loans": lambda ctx, i, data: bool(data),
+    "verification_requests": lambda ctx, i, data: bool(data),
+    "loan_requests": lambda ctx, i, data: bool(data),
+}
+
+def _headers(ctx, role):
+    if role == 'super':
+        return {"Authorization": f"Bearer {ctx.super_token}"}
+    if role == 'customer':
+        return {"Authorization": f"Bearer {ctx.customer_token}"}
+    return {}
+
+def _request(ctx, client, spec, i):
+    """Builds (method, path, headers, kwargs) for iteration i; runs any per-iteration setup untimed."""
+    name, method, path, role, kwargs, _ = spec
+    if kwargs == "admin_pair":
+        kwargs = {"json": {"admin_id": _admin_pair(ctx, client)}}
+    elif kwargs in ("session", "session_chunk"):
+        ctx.session_id = _start_session(ctx, client)
+        kwargs = {"data": PNG_BYTES} if kwargs == "session_chunk" else {}
+    elif callable(kwargs):
+        kwargs = kwargs(ctx, i)
+    path = path(ctx, i) if callable(path) else path
+    return method, path, _headers(ctx, role), kwargs or {}
+
+def _summary(latencies, errors, wall, rss):
+    latencies = sorted(latencies)
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall > 0 else None,
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+    }
+
+def run_client(ctx, client, specs, requests, covered):
+    """Times each endpoint through the test client; adds every URL rule it hit to `covered`."""
+    adapter = ctx.app.app.url_map.bind('localhost')
+    results = {}
+    for spec in specs:
+        latencies, errors = [], 0
+        with RssSampler() as rss:
+            timed = 0.0
+            for i in range(requests):
+                method, path, headers, kwargs = _request(ctx, client, spec, i)
+                covered.add(adapter.match(path.split('?')[0], method=method, return_rule=True)[0].rule)
+                start = time.perf_counter()
+                response = client.open(path, method=method, headers=headers, **kwargs)
+                response.get_data()
+                response.close()
+                elapsed = time.perf_counter() - start
+                timed += elapsed
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors += 1
+                if i == 0 and spec[0] in EXPECT_RESULTS:
+                    data = (response.get_json(silent=True) or {}).get("data")
+                    if not EXPECT_RESULTS[spec[0]](ctx, i, data):
+                        raise SystemExit(f"{spec[0]}: {path} did not return the expected results; "
+                                         "the benchmark would be timing an empty query")
+        # Throughput over the timed requests only, so untimed per-iteration setup doesn't count
+        results[spec[0]] = _summary(latencies, errors, timed, rss.peak_mb)
+        print(f"{spec[0]:<32} p50 {results[spec[0]]['p50_ms']:>9.2f} ms  p95 {results[spec[0]]['p95_ms']:>9.2f} ms  "
+              f"{results[spec[0]]['throughput_rps'] or 0:>8.1f} req/s  errors {errors}")
+    return results
+
+def run_http(ctx, client, specs, requests, concurrency, base_url):
+    results = {}
+    for spec in specs:
+        if not spec[5]:
+            continue
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        # Bodies are built up front (untimed) on this thread
+        prepared = [_request(ctx, client, spec, i) for i in range(requests)]
+
+        def worker(items):
+            for method, path, headers, kwargs in items:
+                body = None
+                headers = dict(headers)
+                if "json" in kwargs:
+                    body = json.dumps(kwargs["json"]).encode()
+                    headers["Content-Type"] = "application/json"
+                req = urllib.request.Request(base_url + path, data=body, headers=headers, method=method)
+                start = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(req, timeout=60) as response:
+                        response.read()
+                    failed = False
+                except urllib.error.HTTPError as e:
+                    e.read()
+                    failed = e.code >= 400 and e.code != 304
+                except OSError:
+                    failed = True
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(prepared[n::concurrency],)) for n in range(concurrency)]
+        with RssSampler() as rss:
+            wall_start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - wall_start
+        results[spec[0]] = _summary(latencies, errors[0], wall, rss.peak_mb)
+        print(f"{spec[0]:<32} p50 {results[spec[0]]['p50_ms']:>9.2f} ms  p95 {results[spec[0]]['p95_ms']:>9.2f} ms  "
+              f"{results[spec[0]]['throughput_rps'] or 0:>8.1f} req/s  errors {errors[0]}")
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(args):
+    _configure_env(args)
+    import app as appmod
+    from werkzeug.serving import make_server
+    # Keep the local server's access log out of the results output
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    specs = [s for s in ENDPOINTS if not args.only or s[0] in args.only.split(',')]
+    ctx = Context(appmod, random.Random(args.seed))
+    client = appmod.app.test_client()
+    prepare(ctx, client)
+    skipped = set()
+    if not ctx.profile_id:
+        # Stored profiles only exist with KYC_PROFILING=1
+        specs = [s for s in specs if s[0] != 'download_profile']
+        skipped.add('/admin/profiles/<profile_id>')
+
+    covered = set()
+    client_results = run_client(ctx, client, specs, args.requests, covered)
+    rules = {r.rule for r in appmod.app.url_map.iter_rules() if r.endpoint != 'static'}
+    uncovered = sorted(rules - covered - skipped)
+    if uncovered and not args.only:
+        print(f"WARNING: routes without a benchmark: {', '.join(uncovered)}")
+
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+            "python": sys.version.split()[0],
+            "engine": os.environ['KYC_DB_ENGINE'],
+            "requests": args.requests,
+            "concurrency": args.concurrency if args.http else 1,
+            "seed": args.seed,
+            "uncovered_routes": uncovered,
+        },
+        "client": client_results,
+    }
+    if args.http:
+        server = None
+        base_url = args.url
+        if not base_url:
+            server = make_server('127.0.0.1', 0, appmod.app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+        try:
+            result["http"] = run_http(ctx, client, specs, args.requests, args.concurrency, base_url)
+        finally:
+            if server:
+                server.shutdown()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {out}")
+    return result
+
+# --- COMPARE ---
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = []
+    for mode in ('client', 'http'):
+        for name, after in new.get(mode, {}).items():
+            before = old.get(mode, {}).get(name)
+            if not before:
+                continue
+            p95 = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            rps = ((after['throughput_rps'] or 0) - (before['throughput_rps'] or 0)) / before['throughput_rps'] * 100 if before['throughput_rps'] else 0.0
+            flag = p95 > args.threshold or rps < -args.threshold
+            if flag:
+                regressions.append(f"{mode}:{name}")
+            print(f"{mode:<6} {name:<32} p95 {before['p95_ms']:>9.2f} -> {after['p95_ms']:>9.2f} ms ({p95:+6.1f}%)  "
+                  f"rps {before['throughput_rps'] or 0:>8.1f} -> {after['throughput_rps'] or 0:>8.1f} ({rps:+6.1f}%)"
+                  f"{'  REGRESSION' if flag else ''}")
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}: {len(regressions)} regression(s) over {args.threshold}%")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="KYC backend benchmark suite")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('seed', 'run'):
+        p = sub.add_parser(name)
+        p.add_argument('--engine', default='sqlite', choices=('sqlite', 'access'))
+        p.add_argument('--db', default=BENCH_DB, help="database file (default db/bench.sqlite3)")
+        p.add_argument('--seed', type=int, default=42)
+    seed_parser = sub.choices['seed']
+    seed_parser.add_argument('--users', type=int, default=10000)
+    seed_parser.add_argument('--loans-per-user', type=float, default=2.0)
+    seed_parser.add_argument('--audit-per-user', type=float, default=5.0)
+
+    run_parser = sub.choices['run']
+    run_parser.add_argument('--requests', type=int, default=100, help="requests per endpoint")
+    run_parser.add_argument('--only', help="comma-separated endpoint names")
+    run_parser.add_argument('--http', action='store_true', help="also load-test over HTTP with concurrent clients")
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--url', help="benchmark a server that is already running instead of a local one")
+    run_parser.add_argument('--out', help="results file (default bench_results/bench_<timestamp>.json)")
+
+    compare_parser = sub.add_parser('compare')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="percent change that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        seed(args)
+    elif args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
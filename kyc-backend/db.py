@@ -1,56 +1,293 @@
-import pyodbc
+import collections
 import datetime
 import os
+import sys
+import threading
+import time
+import uuid
 import security
+import audit
+import cache
+import metrics
+import pool
+import stats
+import storage
 
 # CONFIG
-DB_FILE = os.path.join(os.path.dirname(__file__), 'db', 'kyc.accdb')
-CONN_STR = r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};DBQ=' + DB_FILE + ';'
+ENGINE = storage.get_engine()
+POOL_SIZE = int(os.environ.get('KYC_DB_POOL_SIZE', 5))
+POOL_TIMEOUT = float(os.environ.get('KYC_DB_POOL_TIMEOUT', 10))
 
-def connect_db():
+_pool = pool.ConnectionPool(ENGINE.connect, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping=ENGINE.ping)
+
+# --- QUERY INSTRUMENTATION ---
+# With metrics enabled, cursors time every execute/executemany and count the rows
+# fetched, labelled with the db.py function that ran the statement (the caller's
+# frame name, so no call site has to name its queries).
+#
+# The same cursors feed the slow-query log: a statement whose execute plus fetches
+# take SLOW_QUERY_MS or more is recorded (SQL text, parameter types, duration, rows)
+# when the cursor moves on to the next statement or its connection is closed.
+# Parameter values are never logged, they hold customer data. 0 turns it off.
+SLOW_QUERY_MS = float(os.environ.get('KYC_SLOW_QUERY_MS', 500))
+SLOW_QUERY_KEEP = int(os.environ.get('KYC_SLOW_QUERY_KEEP', 200))
+INSTRUMENTED = metrics.ENABLED or SLOW_QUERY_MS > 0
+
+_slow_queries = collections.deque(maxlen=SLOW_QUERY_KEEP)
+
+def _params_shape(params, many):
+    # "(int, str x 3)" for one statement, "250 x (str, int)" for executemany
+    def types(values):
+        runs = []
+        for value in values:
+            name = type(value).__name__
+            if runs and runs[-1][0] == name:
+                runs[-1][1] += 1
+            else:
+                runs.append([name, 1])
+        return "(" + ", ".join(name if n == 1 else f"{name} x {n}" for name, n in runs) + ")"
+    if params is None:
+        return "()"
+    if not many:
+        return types(params)
+    if not isinstance(params, (list, tuple)):
+        return "iterator"
+    return f"{len(params)} x {types(params[0]) if params else '()'}"
+
+def _log_slow_query(query, sql, params, many, seconds, rows):
+    entry = {
+        "at": datetime.datetime.now().isoformat(timespec='seconds'),
+        "query": query,
+        "sql": " ".join(sql.split())[:2000],
+        "params": _params_shape(params, many),
+        "ms": round(seconds * 1000, 1),
+        "rows": rows,
+    }
+    _slow_queries.append(entry)
+    metrics.DB_SLOW_QUERIES.inc(query)
+    print(f"Slow query in {query} ({entry['ms']} ms, {rows} rows): {entry['sql'][:200]} {entry['params']}")
+
+def slow_queries(limit=None):
+    """Most recent slow statements first."""
+    entries = list(reversed(_slow_queries))
+    return entries[:limit] if limit else entries
+
+class _InstrumentedCursor:
+    def __init__(self, raw):
+        self._raw = raw
+        self._query = None
+        self._statement = None  # (sql, params, many) until the slow-query check has run
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _run(self, method, sql, params, many=False):
+        self._finish()
+        self._query = sys._getframe(2).f_code.co_name
+        self._statement = (sql, params, many)
+        start = time.perf_counter()
+        try:
+            return method(sql, params) if params is not None else method(sql)
+        except Exception:
+            metrics.DB_QUERY_ERRORS.inc(self._query)
+            raise
+        finally:
+            self._elapsed = time.perf_counter() - start
+            metrics.DB_QUERY_DURATION.observe(self._elapsed, self._query)
+
+    def _finish(self):
+        if self._statement is None:
+            return
+        if SLOW_QUERY_MS > 0 and self._elapsed * 1000 >= SLOW_QUERY_MS:
+            rows = self._rows
+            if not rows:
+                # Nothing fetched: report the rows written, where the driver knows it
+                rows = max(getattr(self._raw, 'rowcount', -1), 0)
+            _log_slow_query(self._query, *self._statement, self._elapsed, rows)
+        self._statement = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def execute(self, sql, params=None):
+        self._run(self._raw.execute, sql, params)
+        return self
+
+    def executemany(self, sql, params):
+        self._run(self._raw.executemany, sql, params, many=True)
+        return self
+
+    def _fetched(self, rows, start):
+        self._elapsed += time.perf_counter() - start
+        self._rows += rows
+        metrics.DB_ROWS_FETCHED.inc(self._query, amount=rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._raw.fetchone()
+        self._fetched(0 if row is None else 1, start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._raw.fetchmany(size) if size is not None else self._raw.fetchmany()
+        self._fetched(len(rows), start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._raw.fetchall()
+        self._fetched(len(rows), start)
+        return rows
+
+    def close(self):
+        self._finish()
+        self._raw.close()
+
+class _InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursors = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        cursor = _InstrumentedCursor(self._conn.cursor())
+        self._cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        for cursor in self._cursors:
+            cursor._finish()
+        self._cursors = []
+        self._conn.close()
+
+def connect_db(shared=True):
+    # Returns a pooled connection; close() gives it back to the pool.
+    # Nested calls on the same thread (e.g. log_audit) share the caller's connection,
+    # unless shared=False asks for one of its own (e.g. a long-running export cursor).
     try:
-        return pyodbc.connect(CONN_STR)
+        conn = _pool.acquire(shared=shared)
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
+    return _InstrumentedConnection(conn) if INSTRUMENTED else conn
+
+def pool_stats():
+    return _pool.stats()
+
+# Keyset pagination: rows come back ordered by their id and, when after_id is
+# given, start right after it. limit=None keeps the old "return everything" behaviour.
+def _keyset_sql(base_sql, conditions, params, id_column, after_id=None, limit=None):
+    conditions = list(conditions)
+    params = list(params)
+    if after_id is not None:
+        conditions.append(f"{id_column} > ?")
+        params.append(after_id)
+    sql = base_sql
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {id_column}"
+    if limit is not None:
+        sql = ENGINE.limit(sql, limit)
+    return sql, params
+
+# --- CHANGE COUNTERS ---
+# Every write bumps the version of the tables it touched. app.py uses these to
+# answer repeat list/stats requests from its response cache. The epoch keeps
+# versions from different processes (or restarts) from ever looking equal.
+_VERSION_EPOCH = uuid.uuid4().hex[:8]
+_table_versions = {"USERS": 0, "DOCUMENTS": 0, "LOAN_APPLICATIONS": 0}
+_versions_lock = threading.Lock()
+
+def _bump(*tables):
+    with _versions_lock:
+        for table in tables:
+            _table_versions[table] += 1
+
+def table_versions(*tables):
+    with _versions_lock:
+        return _VERSION_EPOCH + ":" + ":".join(f"{t}={_table_versions[t]}" for t in tables)
 
 # --- AUDIT LOG ---
-def log_audit(user_id, action, ip_address='0.0.0.0'):
+# Audit rows are written in batches by a background thread (see audit.py).
+# KYC_AUDIT_SYNC=1 writes each row inline instead, which tests rely on.
+def _write_audit_rows(rows):
     conn = connect_db()
-    if not conn: return
+    if not conn: raise RuntimeError("Database connection failed")
     try:
         cursor = conn.cursor()
         sql = "INSERT INTO AUDIT_LOG (user_id, action, action_timestamp, ip_address) VALUES (?, ?, ?, ?)"
-        cursor.execute(sql, (user_id, action, datetime.datetime.now(), ip_address))
+        cursor.executemany(sql, rows)
         conn.commit()
-    except Exception as e:
-        print(f"Audit Error: {e}")
     finally:
         conn.close()
 
+_audit = audit.AuditWriter(
+    _write_audit_rows,
+    batch_size=int(os.environ.get('KYC_AUDIT_BATCH', 100)),
+    flush_interval=float(os.environ.get('KYC_AUDIT_FLUSH_INTERVAL', 1.0)),
+    max_queue=int(os.environ.get('KYC_AUDIT_QUEUE', 10000)),
+    sync=os.environ.get('KYC_AUDIT_SYNC', '0') == '1'
+)
+
+def log_audit(user_id, action, ip_address='0.0.0.0'):
+    _audit.log((user_id, action, datetime.datetime.now(), ip_address))
+
+def flush_audit():
+    _audit.flush()
+
+def audit_stats():
+    return _audit.stats()
+
 # --- USERS ---
-def register_user(first_name, last_name, email, phone, dob, password):
+# Argon2 work (and the wait for a hashing slot, up to security.HASH_QUEUE_TIMEOUT) happens
+# with no pooled connection checked out: a burst of logins must not starve other queries.
+def _email_taken(email):
+    """True/False, or None when the database is unreachable."""
     conn = connect_db()
-    if not conn: return False
+    if not conn: return None
     cursor = conn.cursor()
     try:
-        # Check if email exists
         cursor.execute("SELECT user_id FROM USERS WHERE email = ?", (email,))
-        if cursor.fetchone():
-            return False 
-        
+        return cursor.fetchone() is not None
+    finally:
+        conn.close()
+
+def register_user(first_name, last_name, email, phone, dob, password):
+    try:
+        # Check if email exists
+        if _email_taken(email) is not False:
+            return False
+
         # Hash Password
         hashed_pw = security.hash_password(password)
+    except security.HashingBusy:
+        raise
+    except Exception as e:
+        print(f"Register Error: {e}")
+        return False
 
+    conn = connect_db()
+    if not conn: return False
+    cursor = conn.cursor()
+    try:
+        # A concurrent signup with the same email fails here on the UNIQUE index
         sql = """INSERT INTO USERS (first_name, last_name, email, phone, date_of_birth, password_hash, user_type, kyc_status, created_at) 
                  VALUES (?, ?, ?, ?, ?, ?, 'customer', 'pending', ?)"""
         cursor.execute(sql, (first_name, last_name, email, phone, dob, hashed_pw, datetime.datetime.now()))
         conn.commit()
+        _bump("USERS")
+        _stats.customer_registered()
         
         # Get new ID for audit
-        cursor.execute("SELECT @@IDENTITY")
-        row = cursor.fetchone()
-        if row: log_audit(row[0], 'signup')
+        new_id = ENGINE.last_insert_id(cursor)
+        if new_id: log_audit(new_id, 'signup')
         
         return True
     except Exception as e:
@@ -68,30 +305,70 @@ def login_user(email, password):
         cursor.execute("""SELECT user_id, first_name, last_name, user_type, kyc_status, password_hash 
                           FROM USERS WHERE email = ?""", (email,))
         row = cursor.fetchone()
-        if row:
-            stored_hash = row[5]
-            if security.verify_password(stored_hash, password):
-                user_data = {"id": row[0], "name": f"{row[1]} {row[2]}", "role": row[3], "status": row[4]}
-                log_audit(row[0], 'login')
-                return user_data
-        return None
     except Exception as e:
         print(f"Login Error: {e}")
         return None
-    except Exception as e:
-        print(f"Login Error: {e}")
+    finally:
+        conn.close()
+    if not row:
+        return None
+
+    stored_hash = row[5]
+    if not security.verify_password(stored_hash, password):
         return None
+    # Cost parameters changed since this hash was made: upgrade it transparently
+    if security.needs_rehash(stored_hash):
+        try:
+            new_hash = security.hash_password(password)
+        except security.HashingBusy:
+            new_hash = None  # the password was right; upgrade on a quieter login
+        conn = connect_db() if new_hash else None
+        if conn:
+            try:
+                conn.cursor().execute("UPDATE USERS SET password_hash = ? WHERE user_id = ?", (new_hash, row[0]))
+                conn.commit()
+            except Exception as e:
+                # The old hash still works; try again on the next login
+                print(f"Login Error: {e}")
+            finally:
+                conn.close()
+    log_audit(row[0], 'login')
+    return {"id": row[0], "name": f"{row[1]} {row[2]}", "role": row[3], "status": row[4]}
+
+# Role and KYC status per user, looked up once per request by the auth layer in app.py.
+# Writes that change either (verify_user_status, delete_admin) evict the entry, so
+# revocations apply immediately in this process; the TTL bounds staleness elsewhere.
+_auth_cache = cache.TTLCache(
+    max_size=int(os.environ.get('KYC_AUTH_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('KYC_AUTH_CACHE_TTL', 30))
+)
+
+def get_user_auth(user_id):
+    cached = _auth_cache.get(user_id, _auth_cache)
+    if cached is not _auth_cache:
+        return cached
+    conn = connect_db()
+    if not conn: return None  # not cached: a DB hiccup must not lock users out for the TTL
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT user_type, kyc_status FROM USERS WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        auth = {"role": row[0], "kyc_status": row[1]} if row else None
     finally:
         conn.close()
+    _auth_cache.set(user_id, auth)
+    return auth
 
 # --- SUPER ADMIN FUNCTIONS ---
-def get_all_admins():
+def get_all_admins(after_id=None, limit=None):
     conn = connect_db()
     if not conn: return []
     cursor = conn.cursor()
     admins = []
     try:
-        cursor.execute("SELECT user_id, first_name, last_name, email FROM USERS WHERE user_type = 'admin'")
+        sql, params = _keyset_sql("SELECT user_id, first_name, last_name, email FROM USERS",
+                                  ["user_type = 'admin'"], [], "user_id", after_id, limit)
+        cursor.execute(sql, params)
         for row in cursor.fetchall():
             admins.append({"id": row[0], "name": f"{row[1]} {row[2]}", "email": row[3]})
     finally:
@@ -99,32 +376,47 @@ def get_all_admins():
     return admins
 
 def create_admin(first_name, last_name, email, password):
-    conn = connect_db()
-    if not conn: return False
-    cursor = conn.cursor()
     try:
         # Check if email exists
-        cursor.execute("SELECT user_id FROM USERS WHERE email = ?", (email,))
-        if cursor.fetchone(): return False
+        if _email_taken(email) is not False: return False
 
         hashed_pw = security.hash_password(password)
+    except security.HashingBusy:
+        raise
+    except Exception as e:
+        print(f"Create Admin Error: {e}")
+        return False
+
+    conn = connect_db()
+    if not conn: return False
+    cursor = conn.cursor()
+    try:
         sql = """INSERT INTO USERS (first_name, last_name, email, password_hash, user_type, kyc_status, created_at) 
                  VALUES (?, ?, ?, ?, 'admin', 'verified', ?)"""
         cursor.execute(sql, (first_name, last_name, email, hashed_pw, datetime.datetime.now()))
         conn.commit()
+        _bump("USERS")
         return True
-    except:
+    except Exception as e:
+        print(f"Create Admin Error: {e}")
         return False
     finally:
         conn.close()
 
 def delete_admin(admin_id):
+    try:
+        # The JSON body may carry the id as a string; the auth cache is keyed by int
+        admin_id = int(admin_id)
+    except (TypeError, ValueError):
+        return False
     conn = connect_db()
     if not conn: return False
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM USERS WHERE user_id = ? AND user_type = 'admin'", (admin_id,))
         conn.commit()
+        _bump("USERS")
+        _auth_cache.delete(admin_id)
         return True
     except:
         return False
@@ -144,6 +436,7 @@ def upload_document(user_id, doc_type, doc_number, expiry, filepath):
                  VALUES (?, ?, ?, ?, ?, ?, 'pending')"""
         cursor.execute(sql, (user_id, doc_type, encrypted_num, expiry, filepath, datetime.datetime.now()))
         conn.commit()
+        _bump("DOCUMENTS")
         log_audit(user_id, 'document_upload')
         return True, None
     except Exception as e:
@@ -152,62 +445,202 @@ def upload_document(user_id, doc_type, doc_number, expiry, filepath):
     finally:
         conn.close()
 
-def get_user_documents(user_id):
+# List views never decrypt document numbers; they show MASKED_NUMBER and the
+# real value is fetched per document through get_document().
+MASKED_NUMBER = "****"
+_decrypted_numbers = cache.TTLCache(
+    max_size=int(os.environ.get('KYC_DECRYPT_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('KYC_DECRYPT_CACHE_TTL', 60))
+)
+
+def _decrypt_number(encrypted):
+    if not encrypted: return None
+    # Keyed on the ciphertext itself, so there is nothing to invalidate
+    return _decrypted_numbers.get_or_set(encrypted, lambda: security.decrypt_value(encrypted))
+
+DOCUMENT_COLUMNS = "document_id, document_type, document_number, verification_status, upload_date, document_image_path"
+
+def _document_row(row, decrypt=False):
+    return {
+        "document_id": row[0],
+        "type": row[1],
+        "number": _decrypt_number(row[2]) if decrypt else (MASKED_NUMBER if row[2] else None),
+        "status": row[3],
+        "date": row[4],
+        "path": row[5]
+    }
+
+def get_user_documents(user_id, decrypt=False):
     conn = connect_db()
     if not conn: return []
     cursor = conn.cursor()
     docs = []
     try:
-        cursor.execute("SELECT document_type, document_number, verification_status, upload_date, document_image_path FROM DOCUMENTS WHERE user_id = ?", (user_id,))
+        cursor.execute(f"SELECT {DOCUMENT_COLUMNS} FROM DOCUMENTS WHERE user_id = ?", (user_id,))
         for row in cursor.fetchall():
-            decrypted_num = security.decrypt_value(row[1])
-            docs.append({
-                "type": row[0],
-                "number": decrypted_num,
-                "status": row[2],
-                "date": str(row[3]),
-                "path": row[4]
-            })
+            docs.append(_document_row(row, decrypt))
     finally:
         conn.close()
     return docs
 
+def get_document(document_id):
+    conn = connect_db()
+    if not conn: return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT {DOCUMENT_COLUMNS}, user_id FROM DOCUMENTS WHERE document_id = ?", (document_id,))
+        row = cursor.fetchone()
+        if not row: return None
+        doc = _document_row(row, decrypt=True)
+        doc["user_id"] = row[6]
+        return doc
+    finally:
+        conn.close()
+
+# Access rejects very long IN (...) lists, so documents are fetched in batches of user ids
+DOC_BATCH_SIZE = 500
+
+def _documents_for_users(cursor, user_ids):
+    docs_by_user = {user_id: [] for user_id in user_ids}
+    for i in range(0, len(user_ids), DOC_BATCH_SIZE):
+        batch = user_ids[i:i + DOC_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        cursor.execute(f"SELECT user_id, {DOCUMENT_COLUMNS} FROM DOCUMENTS WHERE user_id IN ({placeholders})", batch)
+        for row in cursor.fetchall():
+            docs_by_user[row[0]].append(_document_row(row[1:]))
+    return docs_by_user
+
 # --- VERIFICATIONS (Updated for Unified Users) ---
-def get_verification_requests(show_history=False):
+def get_verification_requests(show_history=False, include_documents=True, after_id=None, limit=None):
     conn = connect_db()
     if not conn: return []
     cursor = conn.cursor()
     requests = []
     try:
-        if show_history:
-            sql = "SELECT user_id, first_name, last_name, email, phone, kyc_status, created_at FROM USERS WHERE user_type = 'customer'"
-        else:
-            sql = "SELECT user_id, first_name, last_name, email, phone, kyc_status, created_at FROM USERS WHERE user_type = 'customer' AND kyc_status = 'pending'"
+        conditions = ["user_type = 'customer'"]
+        if not show_history:
+            conditions.append("kyc_status = 'pending'")
+        sql, params = _keyset_sql("SELECT user_id, first_name, last_name, email, phone, kyc_status, created_at FROM USERS",
+                                  conditions, [], "user_id", after_id, limit)
         
-        cursor.execute(sql)
+        cursor.execute(sql, params)
         for row in cursor.fetchall():
-            # Get docs for this user
-            user_id = row[0]
-            docs = get_user_documents(user_id)
             requests.append({
-                "user_id": user_id,
+                "user_id": row[0],
                 "name": f"{row[1]} {row[2]}",
                 "email": row[3],
                 "phone": row[4],
                 "status": row[5],
-                "created_at": str(row[6]),
-                "documents": docs
+                "created_at": row[6]
             })
+
+        if include_documents:
+            # One batched query for every user's documents instead of one per user
+            docs_by_user = _documents_for_users(cursor, [r["user_id"] for r in requests])
+            for r in requests:
+                r["documents"] = docs_by_user[r["user_id"]]
     finally:
         conn.close()
     return requests
 
+# --- USER SEARCH ---
+# Each search term must match first name, last name, email or phone. Candidates
+# are read in tiers, best first: exact matches, then prefix matches, then (only if
+# those don't fill the page) substring matches, which is what the old in-Python
+# filter did. Exact and prefix lookups are answered from the column indexes and
+# stop after SEARCH_CANDIDATES rows; they are not sorted in SQL, which would read
+# every match first. Candidates are then ranked in Python, oldest account first
+# among equals (within the rows read, for very common prefixes).
+SEARCH_CANDIDATES = 200
+SEARCH_TIERS = ('exact', 'prefix', 'substring')
+
+def _search_score(user, terms):
+    first, last = (user["first_name"] or "").lower(), (user["last_name"] or "").lower()
+    email, phone = (user["email"] or "").lower(), user["phone"] or ""
+    score = 0
+    for term in terms:
+        if term == email: score += 100
+        elif term in (first, last): score += 50
+        elif email.startswith(term): score += 40
+        elif first.startswith(term) or last.startswith(term): score += 30
+        elif phone.startswith(term): score += 20
+        elif term in first or term in last or term in email: score += 10
+    return score
+
+def _search_where(terms, tier):
+    nocase = ENGINE.types['nocase']
+    conditions, params = ["user_type = 'customer'"], []
+    for term in terms:
+        if tier == 'exact':
+            # Access compares text case-insensitively already; SQLite needs NOCASE to use the indexes
+            conditions.append(f"(email{nocase} = ? OR first_name{nocase} = ? OR last_name{nocase} = ? OR phone{nocase} = ?)")
+            params.extend([term] * 4)
+        else:
+            pattern = term + '%' if tier == 'prefix' else '%' + term + '%'
+            conditions.append("(first_name LIKE ? OR last_name LIKE ? OR email LIKE ? OR phone LIKE ?)")
+            params.extend([pattern] * 4)
+    return " WHERE " + " AND ".join(conditions), params
+
+def search_users(query, limit=20, include_documents=True):
+    # Wildcards typed by the user are dropped rather than passed to LIKE
+    terms = [t for t in query.lower().replace('%', '').replace('[', '').split() if t]
+    conn = connect_db()
+    if not conn: return []
+    cursor = conn.cursor()
+    candidates = {}
+    select = "SELECT user_id, first_name, last_name, email, phone, kyc_status, created_at FROM USERS"
+    try:
+        if terms:
+            queries = []
+            for tier in SEARCH_TIERS:
+                where, params = _search_where(terms, tier)
+                queries.append((tier, ENGINE.limit(select + where, max(limit, SEARCH_CANDIDATES)), params))
+        else:
+            sql, params = _keyset_sql(select, ["user_type = 'customer'"], [], "user_id", limit=limit)
+            queries = [(None, sql, params)]
+
+        for tier, sql, params in queries:
+            # Substring matching scans the table, so it only runs when the indexed tiers came up short
+            if tier == 'substring' and len(candidates) >= limit:
+                break
+            cursor.execute(sql, params)
+            for row in cursor.fetchall():
+                candidates.setdefault(row[0], {"user_id": row[0], "first_name": row[1], "last_name": row[2], "email": row[3],
+                                               "phone": row[4], "status": row[5], "created_at": row[6]})
+
+        # Best match first, oldest account breaks ties
+        ranked = sorted(candidates.values(), key=lambda u: (-_search_score(u, terms), u["user_id"]))
+        results = [{
+            "user_id": u["user_id"],
+            "name": f"{u['first_name']} {u['last_name']}",
+            "email": u["email"],
+            "phone": u["phone"],
+            "status": u["status"],
+            "created_at": u["created_at"]
+        } for u in ranked[:limit]]
+
+        if include_documents:
+            docs_by_user = _documents_for_users(cursor, [r["user_id"] for r in results])
+            for r in results:
+                r["documents"] = docs_by_user[r["user_id"]]
+    finally:
+        conn.close()
+    return results
+
 def verify_user_status(admin_id, target_user_id, action):
+    try:
+        # The JSON body may carry the id as a string; the auth cache is keyed by int
+        target_user_id = int(target_user_id)
+    except (TypeError, ValueError):
+        return False
     conn = connect_db()
     if not conn: return False
     cursor = conn.cursor()
     new_status = 'verified' if action == 'approve' else 'rejected'
     try:
+        cursor.execute("SELECT kyc_status, user_type FROM USERS WHERE user_id = ?", (target_user_id,))
+        previous = cursor.fetchone()
+
         # Update User Status
         cursor.execute("UPDATE USERS SET kyc_status = ?, verified_by = ? WHERE user_id = ?", (new_status, admin_id, target_user_id))
         
@@ -216,6 +649,10 @@ def verify_user_status(admin_id, target_user_id, action):
         cursor.execute("UPDATE DOCUMENTS SET verification_status = ? WHERE user_id = ?", (doc_status, target_user_id))
         
         conn.commit()
+        _bump("USERS", "DOCUMENTS")
+        _auth_cache.delete(target_user_id)
+        if previous and previous[1] == 'customer':
+            _stats.kyc_changed(previous[0], new_status)
         log_audit(admin_id, f'kyc_{action}_user_{target_user_id}')
         return True
     except Exception as e:
@@ -224,6 +661,82 @@ def verify_user_status(admin_id, target_user_id, action):
     finally:
         conn.close()
 
+# Each chunk of a bulk verification is one transaction; a failed chunk is rolled back on its own
+VERIFY_BATCH_SIZE = int(os.environ.get('KYC_VERIFY_BATCH', 500))
+KYC_ACTIONS = {'approve': 'verified', 'reject': 'rejected'}
+
+def bulk_verify_users(admin_id, decisions):
+    """decisions: list of (user_id, action). Returns one result dict per decision, in order."""
+    results = [{"user_id": user_id, "success": False} for user_id, _ in decisions]
+    pending = []  # indexes into decisions that passed validation
+    seen = set()
+    for i, (user_id, action) in enumerate(decisions):
+        if action not in KYC_ACTIONS:
+            results[i]["message"] = "Invalid action"
+        elif not isinstance(user_id, int) or isinstance(user_id, bool):
+            results[i]["message"] = "Invalid user id"
+        elif user_id in seen:
+            results[i]["message"] = "Duplicate user id"
+        else:
+            seen.add(user_id)
+            pending.append(i)
+    if not pending:
+        return results
+
+    conn = connect_db()
+    if not conn:
+        for i in pending:
+            results[i]["message"] = "Database connection failed"
+        return results
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(pending), VERIFY_BATCH_SIZE):
+            chunk = pending[start:start + VERIFY_BATCH_SIZE]
+            user_ids = [decisions[i][0] for i in chunk]
+            placeholders = ", ".join("?" * len(user_ids))
+            try:
+                cursor.execute(f"SELECT user_id, kyc_status, user_type FROM USERS WHERE user_id IN ({placeholders})", user_ids)
+                previous = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+                found = [i for i in chunk if decisions[i][0] in previous]
+                for i in chunk:
+                    if decisions[i][0] not in previous:
+                        results[i]["message"] = "User not found"
+                if not found:
+                    continue
+
+                user_rows = [(KYC_ACTIONS[decisions[i][1]], admin_id, decisions[i][0]) for i in found]
+                doc_rows = [(KYC_ACTIONS[decisions[i][1]], decisions[i][0]) for i in found]
+                cursor.executemany("UPDATE USERS SET kyc_status = ?, verified_by = ? WHERE user_id = ?", user_rows)
+                cursor.executemany("UPDATE DOCUMENTS SET verification_status = ? WHERE user_id = ?", doc_rows)
+                conn.commit()
+            except Exception as e:
+                print(f"Bulk Verify Error: {e}")
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                for i in chunk:
+                    if "message" not in results[i]:
+                        results[i]["message"] = "Update failed"
+                continue
+
+            now = datetime.datetime.now()
+            audit_rows = []
+            for i in found:
+                user_id, action = decisions[i]
+                results[i]["success"] = True
+                _auth_cache.delete(user_id)
+                old_status, user_type = previous[user_id]
+                if user_type == 'customer':
+                    _stats.kyc_changed(old_status, KYC_ACTIONS[action])
+                audit_rows.append((admin_id, f'kyc_{action}_user_{user_id}', now, '0.0.0.0'))
+            _bump("USERS", "DOCUMENTS")
+            _audit.log_many(audit_rows)
+        return results
+    finally:
+        conn.close()
+
 # --- LOANS (Updated for LOAN_APPLICATIONS) ---
 def create_loan_request(user_id, amount, term, purpose):
     conn = connect_db()
@@ -232,8 +745,11 @@ def create_loan_request(user_id, amount, term, purpose):
     try:
         sql = """INSERT INTO LOAN_APPLICATIONS (user_id, loan_amount, tenure_months, loan_purpose, application_status, application_date)
                  VALUES (?, ?, ?, ?, 'pending', ?)"""
-        cursor.execute(sql, (user_id, amount, term, purpose, datetime.datetime.now()))
+        applied_at = datetime.datetime.now()
+        cursor.execute(sql, (user_id, amount, term, purpose, applied_at))
         conn.commit()
+        _bump("LOAN_APPLICATIONS")
+        _stats.loan_created(applied_at)
         log_audit(user_id, 'loan_request')
         return True
     except Exception as e:
@@ -242,19 +758,22 @@ def create_loan_request(user_id, amount, term, purpose):
     finally:
         conn.close()
 
-def get_all_loan_requests(status_filter='pending'):
+def get_all_loan_requests(status_filter='pending', after_id=None, limit=None):
     conn = connect_db()
     if not conn: return []
     cursor = conn.cursor()
     loans = []
     try:
-        sql = """SELECT L.loan_id, L.loan_amount, L.tenure_months, L.loan_purpose, L.application_status, L.application_date, 
-                        U.first_name, U.last_name, U.email, U.phone
-                 FROM LOAN_APPLICATIONS L INNER JOIN USERS U ON L.user_id = U.user_id"""
+        conditions, params = [], []
         if status_filter and status_filter != 'all':
-            sql += f" WHERE L.application_status = '{status_filter}'"
+            conditions.append("L.application_status = ?")
+            params.append(status_filter)
+        sql, params = _keyset_sql("""SELECT L.loan_id, L.loan_amount, L.tenure_months, L.loan_purpose, L.application_status, L.application_date, 
+                        U.first_name, U.last_name, U.email, U.phone
+                 FROM LOAN_APPLICATIONS L INNER JOIN USERS U ON L.user_id = U.user_id""",
+                                  conditions, params, "L.loan_id", after_id, limit)
             
-        cursor.execute(sql)
+        cursor.execute(sql, params)
         for row in cursor.fetchall():
             loans.append({
                 "loan_id": row[0],
@@ -262,7 +781,7 @@ def get_all_loan_requests(status_filter='pending'):
                 "term": row[2],
                 "purpose": row[3],
                 "status": row[4],
-                "applied_at": str(row[5]),
+                "applied_at": row[5],
                 "customer_name": f"{row[6]} {row[7]}",
                 "email": row[8],
                 "phone": row[9]
@@ -271,14 +790,15 @@ def get_all_loan_requests(status_filter='pending'):
         conn.close()
     return loans
 
-def get_customer_loans(user_id):
+def get_customer_loans(user_id, after_id=None, limit=None):
     conn = connect_db()
     if not conn: return []
     cursor = conn.cursor()
     loans = []
     try:
-        cursor.execute("""SELECT loan_id, loan_amount, tenure_months, loan_purpose, application_status, application_date, pdf_document_path 
-                          FROM LOAN_APPLICATIONS WHERE user_id = ?""", (user_id,))
+        sql, params = _keyset_sql("""SELECT loan_id, loan_amount, tenure_months, loan_purpose, application_status, application_date, pdf_document_path 
+                          FROM LOAN_APPLICATIONS""", ["user_id = ?"], [user_id], "loan_id", after_id, limit)
+        cursor.execute(sql, params)
         for row in cursor.fetchall():
             loans.append({
                 "loan_id": row[0],
@@ -286,7 +806,7 @@ def get_customer_loans(user_id):
                 "term": row[2],
                 "purpose": row[3],
                 "status": row[4],
-                "applied_at": str(row[5]),
+                "applied_at": row[5],
                 "pdf_path": row[6]
             })
     finally:
@@ -299,12 +819,17 @@ def update_loan_decision(loan_id, decision, admin_id, pdf_path, notes=""):
     cursor = conn.cursor()
     try:
         status = 'approved' if decision == 'approve' else 'rejected'
+        cursor.execute("SELECT application_status FROM LOAN_APPLICATIONS WHERE loan_id = ?", (loan_id,))
+        previous = cursor.fetchone()
         # Update status, admin, date, pdf_path (admin_notes column doesn't exist)
         sql = """UPDATE LOAN_APPLICATIONS 
                  SET application_status = ?, approved_by = ?, approval_date = ?, pdf_document_path = ?
                  WHERE loan_id = ?"""
         cursor.execute(sql, (status, admin_id, datetime.datetime.now(), pdf_path, loan_id))
         conn.commit()
+        _bump("LOAN_APPLICATIONS")
+        if previous:
+            _stats.loan_decided(previous[0], status)
         return True
     except Exception as e:
         print(f"Update Loan Error: {e}")
@@ -312,6 +837,43 @@ def update_loan_decision(loan_id, decision, admin_id, pdf_path, notes=""):
     finally:
         conn.close()
 
+def set_loan_pdf_path(loan_id, pdf_path, expected_status):
+    # Only attach the letter if the decision it was rendered for still stands
+    conn = connect_db()
+    if not conn: raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE LOAN_APPLICATIONS SET pdf_document_path = ? WHERE loan_id = ? AND application_status = ?",
+                       (pdf_path, loan_id, expected_status))
+        conn.commit()
+        _bump("LOAN_APPLICATIONS")
+    finally:
+        conn.close()
+
+# --- STATS ---
+def _load_stat_aggregates(this_month_start, last_month_start, next_month_start):
+    conn = connect_db()
+    if not conn: raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT kyc_status, COUNT(*) FROM USERS WHERE user_type = 'customer' GROUP BY kyc_status")
+        kyc = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.execute("SELECT application_status, COUNT(*) FROM LOAN_APPLICATIONS GROUP BY application_status")
+        loans = {row[0]: row[1] for row in cursor.fetchall()}
+        months = {}
+        for start, end in ((last_month_start, this_month_start), (this_month_start, next_month_start)):
+            cursor.execute("SELECT COUNT(*) FROM LOAN_APPLICATIONS WHERE application_date >= ? AND application_date < ?", (start, end))
+            months[stats.month_key(start)] = cursor.fetchone()[0]
+        return {"kyc": kyc, "loans": loans, "months": months}
+    finally:
+        conn.close()
+
+STATS_RESYNC_SECONDS = int(os.environ.get('KYC_STATS_RESYNC', 300))
+_stats = stats.StatsCounters(_load_stat_aggregates, resync_after=STATS_RESYNC_SECONDS)
+
+def get_stats_summary():
+    return _stats.summary()
+
 def get_loan_details(loan_id):
     conn = connect_db()
     if not conn: return None
@@ -339,23 +901,145 @@ def get_loan_details(loan_id):
     finally:
         conn.close()
 
-def get_export_data():
+# --- EXPORTS ---
+EXPORT_QUERIES = {
+    "customers": "SELECT user_id, first_name, last_name, email, kyc_status, created_at FROM USERS",
+    "loans": """SELECT L.loan_id, U.email, L.loan_amount, L.tenure_months, L.application_status, L.application_date 
+                FROM LOAN_APPLICATIONS L INNER JOIN USERS U ON L.user_id = U.user_id"""
+}
+EXPORT_CHUNK_SIZE = 1000
+
+def iter_export_rows(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields the column names, then each row of the dataset, reading `chunk_size`
+    rows at a time so memory stays flat however large the table is."""
+    conn = connect_db(shared=False)
+    if not conn: raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(EXPORT_QUERIES[dataset])
+        yield [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        conn.close()
+
+def get_export_watermark():
+    """A cheap fingerprint of everything the exports contain: row counts, max ids,
+    status counts and the latest loan decision. It changes whenever an export would."""
     conn = connect_db()
-    if not conn: return {}, {}
+    if not conn: return None
     cursor = conn.cursor()
-    
-    verifications = []
-    cursor.execute("SELECT user_id, first_name, last_name, email, kyc_status, created_at FROM USERS")
-    cols_v = [column[0] for column in cursor.description]
-    for row in cursor.fetchall():
-        verifications.append(dict(zip(cols_v, row)))
-        
-    loans = []
-    cursor.execute("""SELECT L.loan_id, U.email, L.loan_amount, L.tenure_months, L.application_status, L.application_date 
-                      FROM LOAN_APPLICATIONS L INNER JOIN USERS U ON L.user_id = U.user_id""")
-    cols_l = [column[0] for column in cursor.description]
-    for row in cursor.fetchall():
-        loans.append(dict(zip(cols_l, row)))
-        
-    conn.close()
-    return verifications, loans
+    try:
+        cursor.execute("SELECT COUNT(*), MAX(user_id) FROM USERS")
+        users = list(cursor.fetchone())
+        cursor.execute("SELECT kyc_status, COUNT(*) FROM USERS GROUP BY kyc_status")
+        users.append(sorted((str(r[0]), r[1]) for r in cursor.fetchall()))
+        cursor.execute("SELECT COUNT(*), MAX(loan_id), MAX(approval_date) FROM LOAN_APPLICATIONS")
+        loans = [str(v) for v in cursor.fetchone()]
+        cursor.execute("SELECT application_status, COUNT(*) FROM LOAN_APPLICATIONS GROUP BY application_status")
+        loans.append(sorted((str(r[0]), r[1]) for r in cursor.fetchall()))
+        return repr((users, loans))
+    except Exception as e:
+        print(f"Watermark Error: {e}")
+        return None
+    finally:
+        conn.close()
+
+# --- BULK IMPORT ---
+# Used by importer.py. Each call is one transaction; the caller decides the chunk size.
+def get_email_index(user_type=None):
+    """Existing emails (lower-cased) mapped to their user_id, for de-duplicating imports.
+    Pass user_type to map only those users, e.g. 'customer' to resolve loan owners."""
+    conn = connect_db(shared=False)
+    if not conn: raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        if user_type:
+            cursor.execute("SELECT email, user_id FROM USERS WHERE user_type = ?", (user_type,))
+        else:
+            cursor.execute("SELECT email, user_id FROM USERS")
+        index = {}
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                return index
+            for email, user_id in rows:
+                if email:
+                    index[email.lower()] = user_id
+    finally:
+        conn.close()
+
+def import_customers(rows):
+    """rows: (first_name, last_name, email, phone, dob, password_hash, kyc_status, created_at).
+    Returns {email: user_id} for the inserted users."""
+    conn = connect_db()
+    if not conn: raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        sql = """INSERT INTO USERS (first_name, last_name, email, phone, date_of_birth, password_hash, user_type, kyc_status, created_at)
+                 VALUES (?, ?, ?, ?, ?, ?, 'customer', ?, ?)"""
+        cursor.executemany(sql, rows)
+        conn.commit()
+
+        emails = [row[2] for row in rows]
+        new_ids = {}
+        for i in range(0, len(emails), DOC_BATCH_SIZE):
+            batch = emails[i:i + DOC_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            cursor.execute(f"SELECT email, user_id FROM USERS WHERE email IN ({placeholders})", batch)
+            new_ids.update(cursor.fetchall())
+    finally:
+        conn.close()
+    _bump("USERS")
+    _stats.invalidate()
+    now = datetime.datetime.now()
+    _audit.log_many([(user_id, 'signup_import', now, '0.0.0.0') for user_id in new_ids.values()])
+    return new_ids
+
+def import_loans(rows):
+    """rows: (user_id, amount, term, purpose, status, applied_at)."""
+    conn = connect_db()
+    if not conn: raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        sql = """INSERT INTO LOAN_APPLICATIONS (user_id, loan_amount, tenure_months, loan_purpose, application_status, application_date)
+                 VALUES (?, ?, ?, ?, ?, ?)"""
+        cursor.executemany(sql, rows)
+        conn.commit()
+    finally:
+        conn.close()
+    _bump("LOAN_APPLICATIONS")
+    _stats.invalidate()
+    now = datetime.datetime.now()
+    _audit.log_many([(row[0], 'loan_request_import', now, '0.0.0.0') for row in rows])
+
+def refresh_after_import():
+    # Imports may run in a job worker process; this drops the web process's cached views of the data
+    _bump("USERS", "LOAN_APPLICATIONS")
+    _stats.invalidate()
+
+# --- METRICS ---
+# Point-in-time values for /metrics, read when it is scraped
+def _collect_metrics():
+    pool_info = _pool.stats()
+    audit_info = _audit.stats()
+    return [
+        ("kyc_db_pool_connections", "gauge", "Pooled connections by state.",
+         [({"state": state}, pool_info[state]) for state in ("open", "idle", "in_use")]),
+        ("kyc_db_pool_events_total", "counter", "Connection pool events.",
+         [({"event": event}, pool_info[event]) for event in ("creations", "checkouts", "waits", "timeouts", "discards")]),
+        ("kyc_audit_rows_total", "counter", "Audit rows by outcome (inline = written by the caller under backpressure).",
+         [({"outcome": "written"}, audit_info["written"]), ({"outcome": "failed"}, audit_info["failed"]),
+          ({"outcome": "inline"}, audit_info["inline_writes"])]),
+        ("kyc_audit_queue_rows", "gauge", "Audit rows waiting for the background writer.", [({}, audit_info["pending"])]),
+        ("kyc_cache_requests_total", "counter", "In-process cache lookups.",
+         [({"cache": name, "result": result}, getattr(c, attr))
+          for name, c in (("auth", _auth_cache), ("document_numbers", _decrypted_numbers))
+          for result, attr in (("hit", "hits"), ("miss", "misses"))]),
+    ]
+
+metrics.register_collector(_collect_metrics)
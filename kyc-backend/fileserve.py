@@ -0,0 +1,70 @@
+import hashlib
+import mimetypes
+import os
+import re
+from flask import request, send_file, abort, Response
+import werkzeug.security
+import cache
+
+# Shared file-download layer for uploads, decision letters and reports.
+#
+# Every file gets a strong ETag (a content hash) and Last-Modified, so repeat
+# downloads get a 304 and resumed downloads get a 206 byte range. Files whose name
+# is their content hash never change and are marked immutable.
+#
+# KYC_SENDFILE hands the byte transfer to a fronting proxy:
+#   x-sendfile -> X-Sendfile header with the absolute path (Apache, lighttpd)
+#   x-accel    -> X-Accel-Redirect to KYC_ACCEL_PREFIX/<folder>/<file> (nginx internal location)
+
+SENDFILE_MODE = os.environ.get('KYC_SENDFILE', '').lower()
+ACCEL_PREFIX = os.environ.get('KYC_ACCEL_PREFIX', '/_protected').rstrip('/')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASH_CHUNK = 1024 * 1024
+
+CONTENT_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+# (path, mtime, size) -> sha256, so each file version is hashed once
+_etags = cache.TTLCache(max_size=4096, ttl=3600)
+
+def _content_hash(path, stat):
+    def compute():
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    return _etags.get_or_set((path, stat.st_mtime_ns, stat.st_size), compute)
+
+def send_cached(directory, filename):
+    path = werkzeug.security.safe_join(directory, filename)
+    if not path or not os.path.isfile(path):
+        abort(404)
+    stat = os.stat(path)
+
+    basename = os.path.basename(path)
+    immutable = bool(CONTENT_NAME.match(basename))
+    # Content-addressed names already are the hash of their bytes
+    etag = basename.split('.')[0] if immutable else _content_hash(path, stat)
+
+    if SENDFILE_MODE == 'x-accel':
+        mimetype = mimetypes.guess_type(basename)[0] or 'application/octet-stream'
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{ACCEL_PREFIX}/{os.path.basename(os.path.normpath(directory))}/{filename}"
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response = response.make_conditional(request)
+    else:
+        # send_file handles If-None-Match / If-Modified-Since (304) and Range (206);
+        # with USE_X_SENDFILE (set in app.py) it only emits the X-Sendfile header
+        response = send_file(path, etag=etag, last_modified=stat.st_mtime, conditional=True, max_age=0)
+
+    # These downloads are KYC documents and customer reports: never in shared caches
+    response.cache_control.private = True
+    response.cache_control.public = False
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True  # revalidate with the ETag every time
+    return response
@@ -0,0 +1,276 @@
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import db
+import security
+
+# Bulk import of customers and loan books exported from legacy systems.
+#
+# The source file (CSV with a header row, or JSONL) is streamed row by row and
+# validated; valid rows are inserted BATCH_SIZE at a time with executemany, one
+# transaction per batch. Emails are de-duplicated against a set preloaded from
+# USERS (and against earlier rows of the same file). Passwords are hashed in a
+# process pool, since Argon2 is by far the slowest step.
+#
+# After every committed batch the last source line is written to
+# <file>.checkpoint.json; running the same import again resumes after it.
+#
+#   customers: first_name, last_name, email, phone, dob, password | password_hash, kyc_status, created_at
+#   loans:     email, amount, term, purpose, status, applied_at
+#
+#   python importer.py customers legacy_customers.csv
+#   python importer.py loans legacy_loans.jsonl --batch-size 5000
+
+IMPORT_DIR = os.path.join(os.path.dirname(__file__), 'imports')
+BATCH_SIZE = int(os.environ.get('KYC_IMPORT_BATCH', 1000))
+HASH_WORKERS = int(os.environ.get('KYC_IMPORT_HASH_WORKERS', os.cpu_count() or 2))
+MAX_REPORTED_ERRORS = 1000
+# Largest file /admin/import/<dataset> accepts
+MAX_IMPORT_BYTES = int(os.environ.get('KYC_MAX_IMPORT_MB', 200)) * 1024 * 1024
+
+DATASETS = ('customers', 'loans')
+SOURCE_FORMATS = ('.csv', '.jsonl')
+KYC_STATUSES = ('pending', 'verified', 'rejected')
+LOAN_STATUSES = ('pending', 'approved', 'rejected')
+
+class ImportFileError(Exception):
+    pass
+
+# --- READING ---
+def read_rows(path):
+    """Yields (line_number, row dict or None if the line is not valid JSON)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SOURCE_FORMATS:
+        raise ImportFileError(f"Unsupported file type {ext or '(none)'}; use .csv or .jsonl")
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if ext == '.csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+
+# --- VALIDATION ---
+def _text(row, field, required=True, max_length=50):
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    if len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+def _date(row, field, default=None):
+    value = _text(row, field, required=False, max_length=32)
+    if value is None:
+        return default
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{field} is not an ISO date (YYYY-MM-DD)")
+
+def _choice(row, field, choices):
+    value = (_text(row, field, required=False) or choices[0]).lower()
+    if value not in choices:
+        raise ValueError(f"{field} must be one of {', '.join(choices)}")
+    return value
+
+def validate_customer(row, now):
+    """Returns (insert tuple without the hash, plaintext password or None)."""
+    email = _text(row, 'email', max_length=100)
+    if '@' not in email:
+        raise ValueError("email is not valid")
+    password_hash = _text(row, 'password_hash', required=False, max_length=255)
+    password = None
+    if password_hash:
+        if not password_hash.startswith('$argon2'):
+            raise ValueError("password_hash must be an Argon2 hash")
+    else:
+        password = _text(row, 'password', max_length=255)
+    values = (_text(row, 'first_name'), _text(row, 'last_name'), email, _text(row, 'phone', required=False, max_length=20),
+              _date(row, 'dob'), password_hash, _choice(row, 'kyc_status', KYC_STATUSES), _date(row, 'created_at', now))
+    return values, password
+
+def validate_loan(row, email_index, now):
+    email = _text(row, 'email', max_length=100)
+    user_id = email_index.get(email.lower())
+    if user_id is None:
+        raise ValueError(f"no customer with email {email}")
+    try:
+        amount = float(row.get('amount'))
+        term = int(row.get('term'))
+    except (TypeError, ValueError):
+        raise ValueError("amount and term must be numbers")
+    if amount <= 0 or term <= 0:
+        raise ValueError("amount and term must be positive")
+    return (user_id, amount, term, _text(row, 'purpose', max_length=255),
+            _choice(row, 'status', LOAN_STATUSES), _date(row, 'applied_at', now))
+
+# --- CHECKPOINTS ---
+def checkpoint_path(path):
+    return path + '.checkpoint.json'
+
+def remove_source(path):
+    # Uploaded sources are only kept while their job may still retry (and resume)
+    for p in (path, checkpoint_path(path)):
+        if os.path.exists(p):
+            os.remove(p)
+
+def _load_checkpoint(path, dataset):
+    try:
+        with open(checkpoint_path(path)) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return checkpoint if checkpoint.get('dataset') == dataset else None
+
+def _save_checkpoint(path, report):
+    tmp_path = checkpoint_path(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({key: report[key] for key in ('dataset', 'line', 'imported', 'duplicates', 'invalid')}, f)
+    os.replace(tmp_path, checkpoint_path(path))
+
+# --- IMPORT ---
+def _hash_batch(executor, passwords, workers):
+    # One slice per worker so each process gets a single round trip per batch
+    size = max(1, -(-len(passwords) // workers))
+    slices = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    return [h for hashed in executor.map(security.hash_passwords, slices) for h in hashed]
+
+def _insert(dataset, batch, report, email_index):
+    """Inserts one batch of (values, line) pairs. If the bulk insert fails (e.g. an
+    email registered meanwhile), retries the rows one by one and records the ones that fail."""
+    insert = db.import_customers if dataset == 'customers' else db.import_loans
+    try:
+        attempts = [(len(batch), insert([values for values, _ in batch]))]
+    except Exception as e:
+        print(f"Import batch failed, retrying row by row: {e}")
+        attempts = []
+        for values, line_number in batch:
+            try:
+                attempts.append((1, insert([values])))
+            except Exception as row_error:
+                _record_error(report, line_number, str(row_error))
+    for count, new_ids in attempts:
+        report['imported'] += count
+        if dataset == 'customers':
+            email_index.update((email.lower(), user_id) for email, user_id in new_ids.items())
+
+def _record_error(report, line, message):
+    report['invalid'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({"line": line, "message": message})
+
+def run_import(dataset, path, resume=True, batch_size=BATCH_SIZE, hash_workers=HASH_WORKERS, progress=None):
+    """Imports `path` into `dataset` and returns a report dict. Runs as a background
+    job from app.py, or from the command line."""
+    if dataset not in DATASETS:
+        raise ImportFileError(f"Unknown dataset {dataset}")
+    report = {"dataset": dataset, "source": os.path.basename(path), "line": 0, "rows": 0, "imported": 0,
+              "duplicates": 0, "invalid": 0, "errors": [], "resumed_from_line": None}
+    checkpoint = _load_checkpoint(path, dataset) if resume else None
+    if checkpoint:
+        report.update({key: checkpoint[key] for key in ('line', 'imported', 'duplicates', 'invalid')})
+        report['resumed_from_line'] = checkpoint['line']
+    skip_through = report['line']
+
+    # Customers are de-duplicated against every account; loans may only belong to customers
+    email_index = db.get_email_index() if dataset == 'customers' else db.get_email_index('customer')
+    seen_emails = set()  # loans: duplicates are allowed; customers: one row per email
+    now = datetime.datetime.now()
+    start = time.perf_counter()
+    executor = None
+    batch, passwords, last_line = [], [], report['line']
+
+    def flush():
+        nonlocal batch, passwords, executor
+        if not batch:
+            return
+        if dataset == 'customers':
+            pending = [i for i, p in enumerate(passwords) if p is not None]
+            if pending:
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=hash_workers, mp_context=multiprocessing.get_context('spawn'))
+                hashes = _hash_batch(executor, [passwords[i] for i in pending], hash_workers)
+                for i, hashed in zip(pending, hashes):
+                    values, line_number = batch[i]
+                    batch[i] = (values[:5] + (hashed,) + values[6:], line_number)
+        _insert(dataset, batch, report, email_index)
+        report['line'] = last_line
+        _save_checkpoint(path, report)
+        if progress:
+            elapsed = time.perf_counter() - start
+            progress(f"line {last_line}: {report['imported']} imported, {report['duplicates']} duplicates, "
+                     f"{report['invalid']} invalid ({report['rows'] / elapsed:.0f} rows/s)")
+        batch, passwords = [], []
+
+    try:
+        for line_number, row in read_rows(path):
+            if line_number <= skip_through:
+                continue
+            report['rows'] += 1
+            last_line = line_number
+            if row is None:
+                _record_error(report, line_number, "not a JSON object")
+                continue
+            try:
+                if dataset == 'customers':
+                    values, password = validate_customer(row, now)
+                    key = values[2].lower()
+                    if key in email_index or key in seen_emails:
+                        report['duplicates'] += 1
+                        continue
+                    seen_emails.add(key)
+                else:
+                    values, password = validate_loan(row, email_index, now), None
+            except ValueError as e:
+                _record_error(report, line_number, str(e))
+                continue
+            batch.append((values, line_number))
+            passwords.append(password)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        report['line'] = last_line
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Finished: the next run of the same file starts from the top again
+    if os.path.exists(checkpoint_path(path)):
+        os.remove(checkpoint_path(path))
+    elapsed = time.perf_counter() - start
+    report['seconds'] = round(elapsed, 2)
+    report['rows_per_second'] = round(report['rows'] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk import customers or loans from a CSV/JSONL file")
+    parser.add_argument('dataset', choices=DATASETS)
+    parser.add_argument('path')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--hash-workers', type=int, default=HASH_WORKERS)
+    parser.add_argument('--no-resume', action='store_true', help="ignore an existing checkpoint and start from the top")
+    args = parser.parse_args()
+
+    result = run_import(args.dataset, args.path, resume=not args.no_resume, batch_size=args.batch_size,
+                        hash_workers=args.hash_workers, progress=print)
+    db.flush_audit()
+    errors = result.pop('errors')
+    for error in errors[:20]:
+        print(f"  line {error['line']}: {error['message']}")
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,150 @@
+import collections
+import datetime
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+
+# Background jobs (currently: loan decision letters). Work runs in a process
+# pool so ReportLab never blocks a request thread; each job gets an id whose
+# status can be polled. Failed jobs are retried with a growing delay.
+#
+# `fn` must be a picklable top-level function. `on_success(result)` runs in the
+# web process once the work is done (e.g. to record the PDF path in the DB);
+# `on_failure(error)` runs there once the job has failed for good, retries spent.
+
+class JobQueue:
+    def __init__(self, workers=2, max_retries=3, retry_delay=2.0, inline=False, keep=1000):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        # Inline mode runs jobs synchronously on the caller's thread (tests, scripts)
+        self.inline = inline
+        self.keep = keep
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = collections.OrderedDict()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: don't fork a web process full of threads and open DB connections
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def submit(self, kind, fn, *args, on_success=None, on_failure=None):
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "finished_at": None,
+            "_submitted": time.perf_counter(),  # internal: for the duration metric, not returned by get()
+            "_on_failure": on_failure,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune()
+        self._run(job, fn, args, on_success)
+        return job_id
+
+    def _prune(self):
+        # Forget the oldest finished jobs once we hold more than `keep`
+        while len(self._jobs) > self.keep:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest["status"] not in ("done", "failed"):
+                break
+            del self._jobs[oldest_id]
+
+    def _run(self, job, fn, args, on_success):
+        job["attempts"] += 1
+        job["status"] = "running"
+        if self.inline:
+            try:
+                result = fn(*args)
+            except Exception as e:
+                self._failed(job, fn, args, on_success, e)
+            else:
+                self._succeeded(job, fn, args, on_success, result)
+            return
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._reset_executor(executor)
+            self._failed(job, fn, args, on_success, e)
+            return
+
+        def done(f):
+            error = f.exception()
+            if error is not None:
+                if isinstance(error, BrokenProcessPool):
+                    self._reset_executor(executor)
+                self._failed(job, fn, args, on_success, error)
+            else:
+                self._succeeded(job, fn, args, on_success, f.result())
+        future.add_done_callback(done)
+
+    def _succeeded(self, job, fn, args, on_success, result):
+        try:
+            if on_success:
+                on_success(result)
+        except Exception as e:
+            self._failed(job, fn, args, on_success, e)
+            return
+        job["result"] = result
+        job["error"] = None
+        job["status"] = "done"
+        job["finished_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        metrics.JOB_DURATION.observe(time.perf_counter() - job["_submitted"], job["kind"], "done")
+
+    def _failed(self, job, fn, args, on_success, error):
+        job["error"] = str(error)
+        if job["attempts"] <= self.max_retries:
+            job["status"] = "retrying"
+            delay = self.retry_delay * job["attempts"]
+            if self.inline:
+                self._run(job, fn, args, on_success)
+            else:
+                timer = threading.Timer(delay, self._run, (job, fn, args, on_success))
+                timer.daemon = True
+                timer.start()
+            return
+        print(f"Job Error ({job['kind']} {job['id']}): {error}")
+        job["status"] = "failed"
+        job["finished_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        metrics.JOB_DURATION.observe(time.perf_counter() - job["_submitted"], job["kind"], "failed")
+        if job["_on_failure"]:
+            try:
+                job["_on_failure"](error)
+            except Exception as e:
+                print(f"Job Error ({job['kind']} {job['id']}): on_failure: {e}")
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return {k: v for k, v in job.items() if not k.startswith('_')} if job else None
+
+    def counts(self):
+        with self._lock:
+            return dict(collections.Counter(job["status"] for job in self._jobs.values()))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,53 @@
+import datetime
+import decimal
+import json
+import os
+import uuid
+from flask.json.provider import JSONProvider
+
+# Flask JSON provider used for every jsonify() response.
+#
+# Rows from db.py are returned as-is (datetime, Decimal, ...) and converted here
+# in one place: datetimes as "YYYY-MM-DD HH:MM:SS" (what str() used to give the
+# frontend) and Decimal (Access CURRENCY) as a JSON number.
+#
+# KYC_JSON=orjson|stdlib picks the backend; orjson is used when it is installed.
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library
+    orjson = None
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class FastJSONProvider(JSONProvider):
+    backend = os.environ.get('KYC_JSON', 'orjson' if orjson else 'stdlib').lower()
+
+    def dumps(self, obj, **kwargs):
+        if self.backend == 'orjson' and orjson is not None:
+            # PASSTHROUGH_DATETIME routes datetimes through _default so both backends agree
+            return orjson.dumps(obj, default=_default,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps(obj) + "\n", mimetype='application/json')
@@ -0,0 +1,151 @@
+import bisect
+import functools
+import os
+import threading
+import time
+
+# In-process metrics, exposed in Prometheus text format by /metrics in app.py.
+#
+# Counters and histograms are kept per label set under one lock. Collectors are
+# callbacks that report point-in-time values (pool size, queue length, ...) when
+# /metrics is scraped, so they cost nothing in between.
+#
+# KYC_METRICS=0 turns everything off: inc/observe return straight away, the
+# request hooks are not installed and db.py hands out plain connections (unless
+# its slow-query log still needs the instrumented cursors).
+# Each server process keeps its own numbers; scrape every worker separately.
+
+ENABLED = os.environ.get('KYC_METRICS', '1') == '1'
+
+# Seconds; from sub-millisecond cache hits to multi-second exports
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_collectors = []
+_lock = threading.Lock()
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        if not ENABLED:
+            return
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        if not ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            data = self._values.get(label_values)
+            if data is None:
+                data = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            data[index] += 1
+            data[-1] += value
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for label_values, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(data[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class _Timer:
+    """`with histogram.time(*labels):` observes the block's duration; also usable as a decorator."""
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter() if ENABLED else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+    def __call__(self, fn):
+        # wraps() keeps the qualified name, so decorated functions still pickle for jobs.py
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self:
+                return fn(*args, **kwargs)
+        return wrapper
+
+def register_collector(fn):
+    """fn() returns [(name, type, help, [(labels dict, value), ...]), ...] at scrape time."""
+    _collectors.append(fn)
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"Metrics collector error: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+# --- SHARED METRICS ---
+HTTP_REQUESTS = Counter('kyc_http_requests_total', 'HTTP requests by route and status.', ('method', 'route', 'status'))
+HTTP_DURATION = Histogram('kyc_http_request_duration_seconds', 'HTTP request latency by route.', ('method', 'route'))
+DB_QUERY_DURATION = Histogram('kyc_db_query_duration_seconds', 'Time spent in cursor.execute/executemany, by db.py function.', ('query',))
+DB_ROWS_FETCHED = Counter('kyc_db_rows_fetched_total', 'Rows fetched, by db.py function.', ('query',))
+DB_QUERY_ERRORS = Counter('kyc_db_query_errors_total', 'Statements that raised, by db.py function.', ('query',))
+DB_SLOW_QUERIES = Counter('kyc_db_slow_queries_total', 'Statements over KYC_SLOW_QUERY_MS, by db.py function.', ('query',))
+REPORT_DURATION = Histogram('kyc_report_duration_seconds', 'Report generation time (pdf, excel, csv).', ('kind',))
+JOB_DURATION = Histogram('kyc_job_duration_seconds', 'Background job time from submit to finish, by kind and outcome.', ('kind', 'status'))
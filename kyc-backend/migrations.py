@@ -0,0 +1,157 @@
+import datetime
+import security
+
+# Forward-only schema migrations.
+#
+# SCHEMA_VERSION records every migration applied to the database. migrate() runs
+# the ones that are missing, in order, each followed by a commit, and never drops
+# or rewrites existing data. To change the schema, append a new (version, name,
+# function) entry to MIGRATIONS; never edit one that has already shipped.
+#
+# DDL commits on its own (SQLite runs it in autocommit, Access/ODBC commits each
+# statement), so a migration that fails halfway leaves its earlier steps behind.
+# Every step therefore checks before it creates, and rerunning a failed migration
+# picks up where it stopped.
+#
+# Databases created by the old drop-and-recreate init_db have the tables but no
+# SCHEMA_VERSION: the baseline migration only creates what is missing, so they
+# are adopted as-is.
+
+def _create_table(cursor, engine, name, ddl):
+    if engine.table_exists(cursor, name):
+        print(f"{name} table already exists.")
+        return False
+    cursor.execute(ddl)
+    print(f"{name} table created.")
+    return True
+
+def _create_index(cursor, engine, name, table, columns):
+    if engine.index_exists(cursor, table, name):
+        print(f"{name} already exists.")
+        return False
+    cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    print(f"{name} created.")
+    return True
+
+def _001_baseline(cursor, engine):
+    t = engine.types
+    _create_table(cursor, engine, 'USERS', f"""
+        CREATE TABLE USERS (
+            user_id {t['pk']},
+            first_name VARCHAR(50),
+            last_name VARCHAR(50),
+            email VARCHAR(100) UNIQUE,
+            phone VARCHAR(20),
+            date_of_birth DATETIME,
+            password_hash VARCHAR(255),
+            user_type VARCHAR(20),
+            kyc_status VARCHAR(20),
+            created_at DATETIME,
+            verified_by INT
+        )
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM USERS WHERE user_type = 'super_admin'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            INSERT INTO USERS (first_name, last_name, email, password_hash, user_type, kyc_status, created_at)
+            VALUES ('Super', 'Admin', 'super', ?, 'super_admin', 'verified', ?)
+        """, (security.hash_password('mywordislaw'), datetime.datetime.now()))
+        print("Seeded super admin user.")
+
+    _create_table(cursor, engine, 'DOCUMENTS', f"""
+        CREATE TABLE DOCUMENTS (
+            document_id {t['pk']},
+            user_id INT,
+            document_type VARCHAR(50),
+            document_number VARCHAR(50),
+            expiry_date DATETIME,
+            document_image_path VARCHAR(255),
+            upload_date DATETIME,
+            verification_status VARCHAR(20)
+        )
+    """)
+
+    _create_table(cursor, engine, 'LOAN_APPLICATIONS', f"""
+        CREATE TABLE LOAN_APPLICATIONS (
+            loan_id {t['pk']},
+            user_id INT,
+            loan_amount {t['money']},
+            loan_purpose VARCHAR(255),
+            tenure_months INT,
+            application_status VARCHAR(20),
+            application_date DATETIME,
+            approved_by INT,
+            approval_date DATETIME,
+            pdf_document_path VARCHAR(255)
+        )
+    """)
+
+    _create_table(cursor, engine, 'AUDIT_LOG', f"""
+        CREATE TABLE AUDIT_LOG (
+            log_id {t['pk']},
+            user_id INT,
+            action VARCHAR(50),
+            action_timestamp DATETIME,
+            ip_address VARCHAR(50)
+        )
+    """)
+
+def _002_secondary_indexes(cursor, engine):
+    nocase = engine.types['nocase']
+    indexes = [
+        # Documents per user (verification lists, search results, bulk verify)
+        ("idx_documents_user", "DOCUMENTS", "user_id"),
+        # A customer's loans, the pending queue and status filters, monthly counts
+        ("idx_loans_user", "LOAN_APPLICATIONS", "user_id"),
+        ("idx_loans_status", "LOAN_APPLICATIONS", "application_status"),
+        ("idx_loans_date", "LOAN_APPLICATIONS", "application_date"),
+        # Verification queue and KYC stats filter on both (user_type first also serves user_type alone)
+        ("idx_users_type_status", "USERS", "user_type, kyc_status"),
+        ("idx_audit_timestamp", "AUDIT_LOG", "action_timestamp"),
+        # Search in db.search_users (email's UNIQUE index is case-sensitive on SQLite)
+        ("idx_users_first_name", "USERS", f"first_name{nocase}"),
+        ("idx_users_last_name", "USERS", f"last_name{nocase}"),
+        ("idx_users_phone", "USERS", f"phone{nocase}"),
+    ]
+    if nocase:
+        indexes.append(("idx_users_email_nocase", "USERS", f"email{nocase}"))
+    for name, table, columns in indexes:
+        _create_index(cursor, engine, name, table, columns)
+
+MIGRATIONS = [
+    (1, 'baseline schema', _001_baseline),
+    (2, 'secondary indexes', _002_secondary_indexes),
+]
+
+def applied_versions(conn, engine):
+    cursor = conn.cursor()
+    if not engine.table_exists(cursor, 'SCHEMA_VERSION'):
+        cursor.execute("CREATE TABLE SCHEMA_VERSION (version INT PRIMARY KEY, name VARCHAR(100), applied_at DATETIME)")
+        conn.commit()
+        return set()
+    cursor.execute("SELECT version FROM SCHEMA_VERSION")
+    return {row[0] for row in cursor.fetchall()}
+
+def pending(conn, engine):
+    done = applied_versions(conn, engine)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+def migrate(conn, engine):
+    """Applies every pending migration in order; returns the versions applied.
+    A failing migration is re-raised so later ones never run on top of it. Its
+    DDL is not rolled back, but it stays pending and is completed on the next run."""
+    applied = []
+    for version, name, fn in pending(conn, engine):
+        print(f"Applying migration {version}: {name}")
+        cursor = conn.cursor()
+        try:
+            fn(cursor, engine)
+            cursor.execute("INSERT INTO SCHEMA_VERSION (version, name, applied_at) VALUES (?, ?, ?)",
+                           (version, name, datetime.datetime.now()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
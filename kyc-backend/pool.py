@@ -0,0 +1,161 @@
+import threading
+import time
+
+# Bounded connection pool shared by every function in db.py.
+# A thread that already holds a connection gets the same one back (nested calls
+# such as log_audit inside register_user reuse it instead of opening a second).
+
+class PoolTimeout(Exception):
+    pass
+
+class PooledConnection:
+    """Thin proxy around a raw DB-API connection. close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._depth = 0
+        self._broken = False
+        self.last_used = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        self._pool.release(self)
+
+    def invalidate(self):
+        # Mark as unusable; it will be discarded instead of returned to the pool
+        self._broken = True
+
+class ConnectionPool:
+    def __init__(self, connect, size=5, timeout=10.0, ping=None, ping_after=30.0):
+        self._connect = connect
+        self._ping = ping
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {"creations": 0, "checkouts": 0, "waits": 0, "timeouts": 0, "discards": 0}
+
+    # --- CHECKOUT ---
+    def acquire(self, shared=True):
+        """Return a PooledConnection. With shared=True the calling thread's current
+        connection is reused if it already holds one."""
+        if shared:
+            current = getattr(self._local, 'conn', None)
+            if current is not None:
+                current._depth += 1
+                return current
+
+        conn = self._checkout()
+        conn._depth = 1
+        if shared:
+            self._local.conn = conn
+        return conn
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn = None
+                    break
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No connection available after {self.timeout}s (pool size {self.size})")
+                self._cond.wait(remaining)
+            self._stats["checkouts"] += 1
+
+        # Connect / health check outside the lock
+        try:
+            if conn is not None and not self._healthy(conn):
+                self._close_raw(conn)
+                conn = None
+            if conn is None:
+                conn = PooledConnection(self, self._connect())
+                with self._cond:
+                    self._stats["creations"] += 1
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def _healthy(self, conn):
+        if not self._ping or time.monotonic() - conn.last_used < self.ping_after:
+            return True
+        try:
+            self._ping(conn._raw)
+            return True
+        except Exception:
+            return False
+
+    # --- RETURN ---
+    def release(self, conn):
+        conn._depth -= 1
+        if conn._depth > 0:
+            return
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.conn = None
+
+        if not conn._broken:
+            try:
+                # Never hand an open transaction to the next borrower
+                conn._raw.rollback()
+            except Exception:
+                conn._broken = True
+
+        if conn._broken:
+            self._close_raw(conn)
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _close_raw(self, conn):
+        with self._cond:
+            self._stats["discards"] += 1
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            try:
+                conn._raw.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+            })
+        return data
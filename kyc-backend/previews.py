@@ -0,0 +1,80 @@
+import hashlib
+import os
+import threading
+from PIL import Image, ImageOps, UnidentifiedImageError
+import uploads
+
+# Resized, recompressed JPEG previews of uploaded document images, generated on
+# first request and cached on disk. When the cache grows past MAX_CACHE_BYTES the
+# least recently served previews are deleted.
+
+PREVIEW_DIR = os.path.join(os.path.dirname(__file__), 'upload_previews')
+SIZES = {"thumb": 200, "medium": 800}
+JPEG_QUALITY = 75
+MAX_CACHE_BYTES = int(os.environ.get('KYC_PREVIEW_CACHE_MB', 500)) * 1024 * 1024
+
+_lock = threading.Lock()
+_cache_bytes = None  # total size of PREVIEW_DIR, scanned on first use
+
+def _preview_name(rel_path, size, mtime):
+    # Includes the source mtime, so a replaced legacy (non content-addressed) file gets a new preview
+    key = hashlib.sha256(f"{rel_path}:{size}:{mtime}".encode()).hexdigest()
+    return f"{key}.jpg"
+
+def get_preview(rel_path, size):
+    """Returns the preview filename inside PREVIEW_DIR, or None if the upload
+    is not an image (e.g. a PDF), in which case the original should be served."""
+    source = os.path.join(uploads.UPLOAD_DIR, rel_path)
+    name = _preview_name(rel_path, size, os.path.getmtime(source))
+    path = os.path.join(PREVIEW_DIR, name)
+    if os.path.exists(path):
+        os.utime(path)  # mark as recently used for eviction
+        return name
+
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((SIZES[size], SIZES[size]))
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            os.makedirs(PREVIEW_DIR, exist_ok=True)
+            img.save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    except (UnidentifiedImageError, Image.DecompressionBombError, ValueError, OSError):
+        # Not an image, a decompression bomb (over Image.MAX_IMAGE_PIXELS) or a failed
+        # save: serve the original, and don't leave a .tmp that eviction never counts
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return None
+    os.replace(tmp_path, path)
+    _account(os.path.getsize(path))
+    return name
+
+def _account(added):
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(e.stat().st_size for e in os.scandir(PREVIEW_DIR) if e.is_file())
+        else:
+            _cache_bytes += added
+        if _cache_bytes > MAX_CACHE_BYTES:
+            _evict()
+
+def _evict():
+    # Oldest mtime first, down to 90% of the cap so we don't evict on every new preview
+    global _cache_bytes
+    entries = sorted((e for e in os.scandir(PREVIEW_DIR) if e.is_file()), key=lambda e: e.stat().st_mtime)
+    total = sum(e.stat().st_size for e in entries)
+    target = MAX_CACHE_BYTES * 0.9
+    for entry in entries:
+        if total <= target:
+            break
+        try:
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            total -= size
+        except OSError:
+            pass
+    _cache_bytes = total
@@ -0,0 +1,107 @@
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+
+# On-demand request profiling (off unless KYC_PROFILING=1).
+#
+# When enabled, an admin request carrying "X-KYC-Profile: 1", or any request whose
+# path starts with one of KYC_PROFILE_PATHS (comma-separated), runs under cProfile.
+# The result is kept in PROFILE_DIR as <id>.prof (for snakeviz / pstats) plus a
+# text summary of the top functions by cumulative time, and the response carries
+# X-KYC-Profile-Id. Admins list and download them via /admin/profiles.
+#
+# cProfile sees the request thread only: Argon2 hashing shows up as waiting on
+# its pool, and letters rendered by a job worker are not included.
+
+ENABLED = os.environ.get('KYC_PROFILING', '0') == '1'
+HEADER = 'X-KYC-Profile'
+PROFILE_PATHS = tuple(p.strip() for p in os.environ.get('KYC_PROFILE_PATHS', '').split(',') if p.strip())
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'profiles')
+KEEP = int(os.environ.get('KYC_PROFILE_KEEP', 50))
+TOP_FUNCTIONS = 60
+
+PROFILE_ID = re.compile(r'^\d{8}_\d{6}_[0-9a-f]{8}$')
+
+# One profiled request at a time: profiles of concurrent requests would be hard to
+# read, and newer Pythons allow only one active profiler per process
+_active = threading.Lock()
+
+class RequestProfile:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+
+def start():
+    """Returns a running RequestProfile, or None if another request is being profiled."""
+    if not _active.acquire(blocking=False):
+        return None
+    profile = RequestProfile()
+    try:
+        profile.profiler.enable()
+    except ValueError:
+        # Another profiler (e.g. a debugger) already owns the hook
+        _active.release()
+        return None
+    return profile
+
+def stop(profile, method, path, route, status):
+    """Stops the profile, stores it and returns its id."""
+    profile.profiler.disable()
+    duration = time.perf_counter() - profile.started
+    _active.release()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    base = os.path.join(PROFILE_DIR, profile_id)
+    profile.profiler.dump_stats(base + '.prof')
+
+    summary = io.StringIO()
+    stats = pstats.Stats(profile.profiler, stream=summary)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    with open(base + '.txt', 'w') as f:
+        f.write(f"{method} {path} -> {status} in {duration * 1000:.1f} ms\n\n")
+        f.write(summary.getvalue())
+
+    meta = {"id": profile_id, "method": method, "path": path, "route": route, "status": status,
+            "duration_ms": round(duration * 1000, 2), "created_at": datetime.datetime.now().isoformat(timespec='seconds')}
+    with open(base + '.json', 'w') as f:
+        json.dump(meta, f)
+    _prune()
+    return profile_id
+
+def _prune():
+    metas = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+    for name in metas[:-KEEP] if KEEP > 0 else []:
+        for ext in ('.json', '.prof', '.txt'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-5] + ext))
+            except OSError:
+                pass
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            pass
+    return profiles
+
+def profile_filename(profile_id, fmt='prof'):
+    """File name inside PROFILE_DIR for a stored profile, or None for an unknown id/format."""
+    if not PROFILE_ID.match(profile_id or '') or fmt not in ('prof', 'text'):
+        return None
+    filename = f"{profile_id}.{'txt' if fmt == 'text' else 'prof'}"
+    return filename if os.path.exists(os.path.join(PROFILE_DIR, filename)) else None
@@ -1,12 +1,22 @@
 import os
+import io
+import csv
+import json
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 import datetime
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import metrics
 
 EXPORT_DIR = os.path.join(os.path.dirname(__file__), 'admin_exports')
 REPORT_DIR = os.path.join(os.path.dirname(__file__), 'reports')
@@ -39,30 +49,56 @@ def draw_footer(canvas, doc):
     canvas.drawRightString(8*inch, 0.5*inch, "Page %d" % doc.page)
     canvas.restoreState()
 
+# Styles never change between letters, so they are built once per process
+# (getSampleStyleSheet() and ParagraphStyle inheritance are surprisingly slow).
+_styles = None
+
+def get_styles():
+    global _styles
+    if _styles is None:
+        styles = getSampleStyleSheet()
+        
+        # Custom Styles
+        styles.add(ParagraphStyle(name='DecisionTitle', parent=styles['Heading1'], fontSize=24, spaceAfter=20, textColor=colors.HexColor('#1e293b')))
+        styles.add(ParagraphStyle(name='SectionHeader', parent=styles['Heading2'], fontSize=14, spaceBefore=20, spaceAfter=10, textColor=colors.HexColor('#6366f1')))
+        styles.add(ParagraphStyle(name='NormalCustom', parent=styles['Normal'], fontSize=12, leading=16))
+        styles.add(ParagraphStyle(name='DecisionApproved', parent=styles['DecisionTitle'], textColor=colors.HexColor('#10b981')))
+        styles.add(ParagraphStyle(name='DecisionRejected', parent=styles['DecisionTitle'], textColor=colors.HexColor('#ef4444')))
+        _styles = styles
+    return _styles
+
+DETAILS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8fafc')),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#475569')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
+    ('BOX', (0,0), (-1,-1), 1, colors.HexColor('#6366f1'))
+])
+
+# Timings land in kyc_report_duration_seconds of the process that renders: a job
+# worker's are not scraped, so background letters show up in kyc_job_duration_seconds
+@metrics.REPORT_DURATION.time('pdf')
 def generate_loan_pdf(loan_data):
     if not os.path.exists(EXPORT_DIR):
-        os.makedirs(EXPORT_DIR)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
         
     filename = f"loan_{loan_data['loan_id']}_{loan_data['status']}.pdf"
     filepath = os.path.join(EXPORT_DIR, filename)
     
     doc = SimpleDocTemplate(filepath, pagesize=letter)
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles
-    styles.add(ParagraphStyle(name='DecisionTitle', parent=styles['Heading1'], fontSize=24, spaceAfter=20, textColor=colors.HexColor('#1e293b')))
-    styles.add(ParagraphStyle(name='SectionHeader', parent=styles['Heading2'], fontSize=14, spaceBefore=20, spaceAfter=10, textColor=colors.HexColor('#6366f1')))
-    styles.add(ParagraphStyle(name='NormalCustom', parent=styles['Normal'], fontSize=12, leading=16))
+    styles = get_styles()
     
     content = []
     
     # Title
     decision_text = "Loan APPROVED" if loan_data['status'] == 'approved' else "Loan REJECTED"
-    decision_color = colors.HexColor('#10b981') if loan_data['status'] == 'approved' else colors.HexColor('#ef4444')
+    decision_style = styles['DecisionApproved'] if loan_data['status'] == 'approved' else styles['DecisionRejected']
     
     content.append(Spacer(1, 0.5*inch))
-    content.append(Paragraph(f"Notice of Decision: {decision_text}", 
-                             ParagraphStyle(name='DecisionColor', parent=styles['DecisionTitle'], textColor=decision_color)))
+    content.append(Paragraph(f"Notice of Decision: {decision_text}", decision_style))
     
     content.append(Paragraph(f"Dear {loan_data['customer']},", styles['NormalCustom']))
     content.append(Spacer(1, 12))
@@ -87,16 +123,7 @@ def generate_loan_pdf(loan_data):
     ]
     
     t = Table(data, colWidths=[2.5*inch, 4*inch])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8fafc')),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#475569')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
-        ('BOX', (0,0), (-1,-1), 1, colors.HexColor('#6366f1'))
-    ]))
+    t.setStyle(DETAILS_TABLE_STYLE)
     content.append(t)
     
     content.append(Spacer(1, 40))
@@ -108,29 +135,123 @@ def generate_loan_pdf(loan_data):
     doc.build(content, onFirstPage=draw_header, onLaterPages=draw_footer)
     return filename
 
-def generate_excel_report(verifications, loans):
+def _render_letter(loan_data):
+    # Batch worker: never raises, so one bad letter doesn't abort the batch
+    try:
+        return loan_data['loan_id'], generate_loan_pdf(loan_data), None
+    except Exception as e:
+        return loan_data.get('loan_id'), None, str(e)
+
+def generate_loan_pdfs(loans, workers=None):
+    """Render many decision letters in one call, optionally across `workers` processes.
+    Returns the filenames per loan id, any errors and the achieved throughput."""
+    start = time.perf_counter()
+    if workers and workers > 1 and len(loans) > 1:
+        # spawn, like jobs.py: never fork a process holding pool connections and locks
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            chunksize = max(1, len(loans) // (workers * 4))
+            results = list(executor.map(_render_letter, loans, chunksize=chunksize))
+    else:
+        results = [_render_letter(loan) for loan in loans]
+    elapsed = time.perf_counter() - start
+
+    files = {loan_id: filename for loan_id, filename, error in results if not error}
+    errors = {loan_id: error for loan_id, filename, error in results if error}
+    return {
+        "files": files,
+        "errors": errors,
+        "count": len(files),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(files) / elapsed, 1) if elapsed > 0 else 0
+    }
+
+# Excel exports are cached per data watermark: if nothing changed since the
+# last export, the existing workbook is returned instead of being rebuilt.
+EXCEL_CACHE_FILE = os.path.join(REPORT_DIR, 'excel_cache.json')
+
+def _cached_excel(watermark):
+    try:
+        with open(EXCEL_CACHE_FILE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('watermark') == watermark and os.path.exists(os.path.join(REPORT_DIR, cached.get('filename', ''))):
+        return cached['filename']
+    return None
+
+@metrics.REPORT_DURATION.time('excel')
+def generate_excel_report(sheets, watermark=None):
+    """Writes each (sheet_name, rows) pair to one workbook. `rows` is any iterable with
+    the header first (e.g. db.iter_export_rows()); openpyxl's write-only mode streams
+    them to disk instead of building the workbook in memory."""
     if not os.path.exists(REPORT_DIR):
         os.makedirs(REPORT_DIR)
+
+    if watermark is not None:
+        cached = _cached_excel(watermark)
+        if cached:
+            return cached
         
     filename = f"Full_Report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     filepath = os.path.join(REPORT_DIR, filename)
     
-    with pd.ExcelWriter(filepath) as writer:
-        if verifications:
-            pd.DataFrame(verifications).to_excel(writer, sheet_name='Verifications', index=False)
-        if loans:
-            pd.DataFrame(loans).to_excel(writer, sheet_name='Loan Requests', index=False)
+    wb = Workbook(write_only=True)
+    for sheet_name, rows in sheets:
+        ws = wb.create_sheet(title=sheet_name)
+        rows = iter(rows)
+        header = next(rows, None)
+        if header is None:
+            continue
+        ws.append([_header_cell(ws, name) for name in header])
+        for row in rows:
+            ws.append(list(row))
+    # Write under a per-thread temp name so a half-written file is never served from
+    # the cache, and two exports started in the same second don't collide
+    tmp_path = f"{filepath}.{threading.get_ident()}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, filepath)
+
+    if watermark is not None:
+        tmp_path = f"{EXCEL_CACHE_FILE}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"watermark": watermark, "filename": filename}, f)
+        os.replace(tmp_path, EXCEL_CACHE_FILE)
             
     return filename
 
-def generate_csv_export(data, type_name):
+def _header_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = HEADER_FONT
+    return cell
+
+HEADER_FONT = Font(bold=True)
+
+CSV_CHUNK_ROWS = 1000
+
+def iter_csv(rows):
+    """Encodes rows (header first) as CSV text, one chunk per CSV_CHUNK_ROWS rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@metrics.REPORT_DURATION.time('csv')
+def generate_csv_export(rows, type_name):
+    # `rows` is any iterable (header first), e.g. db.iter_export_rows(); nothing is held in memory
     if not os.path.exists(REPORT_DIR):
         os.makedirs(REPORT_DIR)
     
     filename = f"{type_name}_Export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     filepath = os.path.join(REPORT_DIR, filename)
     
-    df = pd.DataFrame(data)
-    df.to_csv(filepath, index=False)
+    with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        for chunk in iter_csv(rows):
+            f.write(chunk)
     
     return filename
@@ -1,6 +1,9 @@
 from argon2 import PasswordHasher
 from cryptography.fernet import Fernet
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
+import time
 
 # --- CONFIG ---
 # In a real app, keep this key SAFE (env var). For this student project, we store it here or verify existence.
@@ -16,19 +19,76 @@ def load_or_generate_key():
             f.write(key)
         return key
 
+# Argon2 cost (argon2-cffi defaults). Changing these is safe: existing hashes still
+# verify and are upgraded on the user's next login (see needs_rehash).
+HASH_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 3))
+HASH_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 65536))  # KiB
+HASH_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 4))
+
+# Hashing runs on a dedicated bounded pool so a burst of logins can't take every CPU.
+# At most HASH_WORKERS hashes run at once and HASH_MAX_PENDING more may wait;
+# beyond that callers give up after HASH_QUEUE_TIMEOUT seconds with HashingBusy.
+HASH_WORKERS = int(os.environ.get('KYC_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+HASH_MAX_PENDING = int(os.environ.get('KYC_HASH_MAX_PENDING', HASH_WORKERS * 4))
+HASH_QUEUE_TIMEOUT = float(os.environ.get('KYC_HASH_QUEUE_TIMEOUT', 5))
+
 cipher_suite = Fernet(load_or_generate_key())
-ph = PasswordHasher()
+ph = PasswordHasher(time_cost=HASH_TIME_COST, memory_cost=HASH_MEMORY_COST, parallelism=HASH_PARALLELISM)
+
+class HashingBusy(Exception):
+    pass
+
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='argon2')
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_MAX_PENDING)
+
+def _run_hashing(fn, *args):
+    # argon2-cffi releases the GIL while hashing, so worker threads really run in parallel
+    if not _hash_slots.acquire(timeout=HASH_QUEUE_TIMEOUT):
+        raise HashingBusy(f"Password hashing queue full (waited {HASH_QUEUE_TIMEOUT}s)")
+    try:
+        future = _hash_pool.submit(fn, *args)
+    except Exception:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda f: _hash_slots.release())
+    return future.result()
 
 # --- PASSWORD HASHING (Argon2) ---
 def hash_password(password):
-    return ph.hash(password)
+    return _run_hashing(ph.hash, password)
+
+def hash_passwords(passwords):
+    # Bulk imports call this from their own process pool (see importer.py), not _hash_pool
+    return [ph.hash(p) for p in passwords]
 
 def verify_password(hash, password):
     try:
-        return ph.verify(hash, password)
+        return _run_hashing(ph.verify, hash, password)
+    except HashingBusy:
+        raise
     except:
         return False
 
+def needs_rehash(hash):
+    # True when the stored hash was made with different cost parameters
+    try:
+        return ph.check_needs_rehash(hash)
+    except:
+        return False
+
+def benchmark_hash_params(time_costs=(1, 2, 3, 4), memory_costs=(19456, 47104, 65536), parallelism=HASH_PARALLELISM, rounds=5):
+    """Times one hash+verify for each cost combination, to pick ARGON2_* values."""
+    results = []
+    for memory_cost in memory_costs:
+        for time_cost in time_costs:
+            hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                hasher.verify(hasher.hash("benchmark-password"), "benchmark-password")
+            ms = (time.perf_counter() - start) / rounds * 1000
+            results.append({"time_cost": time_cost, "memory_cost": memory_cost, "parallelism": parallelism, "ms": round(ms, 1)})
+    return results
+
 # --- DATA ENCRYPTION (AES-256) ---
 def encrypt_value(text):
     if not text: return None
@@ -40,3 +100,9 @@ def decrypt_value(encrypted_text):
         return cipher_suite.decrypt(encrypted_text.encode()).decode()
     except:
         return "[Encrypted]" # Fail safe
+
+if __name__ == '__main__':
+    # python security.py  -> prints hash+verify latency for a grid of Argon2 parameters
+    print(f"{'time_cost':>9} {'memory_kib':>10} {'parallelism':>11} {'ms':>8}")
+    for r in benchmark_hash_params():
+        print(f"{r['time_cost']:>9} {r['memory_cost']:>10} {r['parallelism']:>11} {r['ms']:>8}")
@@ -0,0 +1,127 @@
+import datetime
+import threading
+import time
+
+# Dashboard counters kept up to date by the write functions in db.py, so the
+# /admin/stats endpoints never have to scan USERS or LOAN_APPLICATIONS.
+#
+# The counters are seeded (and periodically re-seeded, to pick up writes made by
+# other worker processes) from SQL aggregates via the `load` callback.
+#
+# The load runs without the lock. Every update and invalidate() bumps a generation
+# number: if it moved while a load was running, the snapshot may or may not include
+# those writes, so the load is retried once and otherwise installed as stale (the
+# next read reloads).
+
+LOAD_ATTEMPTS = 2
+
+def month_key(when):
+    return when.strftime('%Y-%m')
+
+def previous_month(when):
+    first = when.replace(day=1)
+    return first - datetime.timedelta(days=1)
+
+class StatsCounters:
+    def __init__(self, load, resync_after=300):
+        # load(this_month_start, last_month_start, next_month_start) -> {"kyc": {...}, "loans": {...}, "months": {...}}
+        self._load = load
+        self.resync_after = resync_after
+        self._lock = threading.Lock()
+        self._data = None
+        self._generation = 0
+        self._loaded_at = 0
+        self._loaded_month = None
+
+    def _month_bounds(self, now):
+        this_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        last_start = previous_month(this_start).replace(day=1)
+        next_start = (this_start + datetime.timedelta(days=32)).replace(day=1)
+        return this_start, last_start, next_start
+
+    def _ensure_loaded(self, now):
+        """Returns the counters dict in use; read it under self._lock."""
+        for attempt in range(1, LOAD_ATTEMPTS + 1):
+            with self._lock:
+                fresh = (self._data is not None
+                         and self._loaded_month == month_key(now)
+                         and time.monotonic() - self._loaded_at < self.resync_after)
+                if fresh:
+                    return self._data
+                generation = self._generation
+            data = self._load(*self._month_bounds(now))
+            with self._lock:
+                raced = self._generation != generation
+                if raced and attempt < LOAD_ATTEMPTS:
+                    continue
+                self._data = data
+                self._loaded_at = 0 if raced else time.monotonic()
+                self._loaded_month = month_key(now)
+                return data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._generation += 1
+
+    # --- UPDATES (no-ops until the counters have been loaded once) ---
+    def _bump(self, group, key, delta=1):
+        with self._lock:
+            self._generation += 1
+            if self._data is None or key is None:
+                return
+            counts = self._data[group]
+            counts[key] = counts.get(key, 0) + delta
+
+    def customer_registered(self):
+        self._bump("kyc", "pending")
+
+    def kyc_changed(self, old_status, new_status):
+        if old_status == new_status:
+            return
+        self._bump("kyc", old_status, -1)
+        self._bump("kyc", new_status)
+
+    def loan_created(self, when):
+        self._bump("loans", "pending")
+        self._bump("months", month_key(when))
+
+    def loan_decided(self, old_status, new_status):
+        if old_status == new_status:
+            return
+        self._bump("loans", old_status, -1)
+        self._bump("loans", new_status)
+
+    # --- READ ---
+    def summary(self, now=None):
+        now = now or datetime.datetime.now()
+        data = self._ensure_loaded(now)
+        with self._lock:
+            kyc = dict(data["kyc"])
+            loans = dict(data["loans"])
+            months = dict(data["months"])
+
+        kyc_total = sum(kyc.values())
+        loan_total = sum(loans.values())
+        verified = kyc.get("verified", 0)
+        approved = loans.get("approved", 0)
+        return {
+            "kyc": {
+                "total": kyc_total,
+                "verified": verified,
+                "pending": kyc.get("pending", 0),
+                "rejected": kyc.get("rejected", 0),
+                "rate": round(verified / kyc_total * 100, 1) if kyc_total else 0
+            },
+            "loans": {
+                "total": loan_total,
+                "approved": approved,
+                "pending": loans.get("pending", 0),
+                "rejected": loans.get("rejected", 0),
+                "rate": round(approved / loan_total * 100, 1) if loan_total else 0
+            },
+            "monthly": {
+                "this_month": months.get(month_key(now), 0),
+                "last_month": months.get(month_key(previous_month(now)), 0)
+            }
+        }
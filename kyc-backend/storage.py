@@ -0,0 +1,129 @@
+import datetime
+import os
+import re
+import sqlite3
+
+# Storage engines behind db.py. Pick one with KYC_DB_ENGINE=access|sqlite
+# (KYC_DB_PATH overrides the database file location).
+#
+# An engine knows how to open a DB-API connection and papers over the few
+# dialect differences the queries in db.py / migrations.py run into.
+
+DB_DIR = os.path.join(os.path.dirname(__file__), 'db')
+
+class AccessEngine:
+    name = 'access'
+    # Column types used by the schema in migrations.py; "nocase" is appended to index
+    # columns that are searched with LIKE (Access text comparisons are already case-insensitive)
+    types = {"pk": "COUNTER PRIMARY KEY", "money": "CURRENCY", "nocase": ""}
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DB_DIR, 'kyc.accdb')
+        self.conn_str = r'DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};DBQ=' + self.path + ';'
+
+    def connect(self):
+        # Imported lazily so the SQLite engine works on machines without an ODBC driver manager
+        import pyodbc
+        return pyodbc.connect(self.conn_str)
+
+    def ping(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+
+    def limit(self, sql, n):
+        # Access has no LIMIT clause; TOP goes right after the first SELECT
+        return re.sub(r'^\s*SELECT\b', f'SELECT TOP {int(n)}', sql, count=1)
+
+    def last_insert_id(self, cursor):
+        cursor.execute("SELECT @@IDENTITY")
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def table_exists(self, cursor, name):
+        return cursor.tables(table=name, tableType='TABLE').fetchone() is not None
+
+    def index_exists(self, cursor, table, name):
+        # SQLStatistics lists the table's indexes (plus one row without a name for the table itself)
+        return any((row.index_name or '').lower() == name.lower() for row in cursor.statistics(table).fetchall())
+
+    def analyze(self, conn):
+        # Access refreshes its optimizer statistics when the database is compacted
+        pass
+
+class SQLiteEngine:
+    name = 'sqlite'
+    # SQLite's LIKE is case-insensitive, so it can only use an index built with NOCASE
+    types = {"pk": "INTEGER PRIMARY KEY AUTOINCREMENT", "money": "NUMERIC", "nocase": " COLLATE NOCASE"}
+
+    # WAL lets readers run alongside the single writer; the rest trades a little
+    # durability on power loss (never corruption) for far fewer fsyncs.
+    PRAGMAS = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA cache_size = -65536",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA mmap_size = 268435456",
+    ]
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DB_DIR, 'kyc.sqlite3')
+
+    def connect(self):
+        if self.path != ':memory:' and not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        # Pooled connections move between threads, one borrower at a time
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def ping(self, conn):
+        conn.execute("SELECT 1").fetchone()
+
+    def limit(self, sql, n):
+        return f"{sql} LIMIT {int(n)}"
+
+    def last_insert_id(self, cursor):
+        cursor.execute("SELECT last_insert_rowid()")
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def table_exists(self, cursor, name):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE", (name,))
+        return cursor.fetchone() is not None
+
+    def index_exists(self, cursor, table, name):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ? COLLATE NOCASE", (name,))
+        return cursor.fetchone() is not None
+
+    def analyze(self, conn):
+        # Without statistics the planner prefers idx_users_type_status over the
+        # NOCASE indexes for prefix searches, which then scans every customer
+        conn.execute("ANALYZE")
+        conn.commit()
+
+# Store DATETIME columns as ISO text and read them back as datetime objects,
+# so rows look the same as the ones pyodbc returns from Access.
+def _adapt_datetime(value):
+    return value.isoformat(" ", timespec="seconds")
+
+def _convert_datetime(raw):
+    text = raw.decode()
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+sqlite3.register_adapter(datetime.datetime, _adapt_datetime)
+sqlite3.register_converter("DATETIME", _convert_datetime)
+
+ENGINES = {"access": AccessEngine, "sqlite": SQLiteEngine}
+
+def get_engine(name=None, path=None):
+    name = (name or os.environ.get('KYC_DB_ENGINE', 'access')).lower()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown KYC_DB_ENGINE '{name}' (expected one of: {', '.join(ENGINES)})")
+    return ENGINES[name](path or os.environ.get('KYC_DB_PATH'))
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+import werkzeug.utils
+
+# Content-addressed storage for uploaded documents.
+#
+# Files are streamed to a temp file in CHUNK_SIZE pieces while being hashed, then
+# moved to uploads/<aa>/<bb>/<sha256><ext>. A multipart body has already been
+# spooled by Werkzeug at that point; app.py caps the whole request at
+# MAX_REQUEST_BYTES (MAX_CONTENT_LENGTH, which also covers chunked bodies without
+# a Content-Length) and the byte count while copying is the second check. Uploading the same bytes twice stores
+# them once. Large scans can also be sent as a resumable session: start, append
+# chunks at the server's offset (retrying after a dropped connection), finish.
+
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), 'uploads')
+# Kept outside UPLOAD_DIR so partial files are never served by /uploads
+WORK_DIR = os.path.join(os.path.dirname(__file__), 'upload_sessions')
+
+MAX_UPLOAD_BYTES = int(os.environ.get('KYC_MAX_UPLOAD_MB', 20)) * 1024 * 1024
+# Form fields and multipart boundaries on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+CHUNK_SIZE = 64 * 1024
+SESSION_MAX_AGE = 24 * 3600
+
+class UploadError(Exception):
+    pass
+
+class UploadTooLarge(UploadError):
+    pass
+
+def _ensure_dirs():
+    for d in (UPLOAD_DIR, WORK_DIR):
+        if not os.path.exists(d):
+            os.makedirs(d, exist_ok=True)
+
+def _extension(filename):
+    ext = os.path.splitext(werkzeug.utils.secure_filename(filename or ''))[1].lower()
+    return ext if 1 < len(ext) <= 8 else ''
+
+def _copy_stream(stream, out, limit, digest=None):
+    """Copies stream into out in CHUNK_SIZE pieces; returns bytes written."""
+    written = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > limit:
+            raise UploadTooLarge(f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+        if digest is not None:
+            digest.update(chunk)
+        out.write(chunk)
+
+def _commit_blob(tmp_path, sha256, ext):
+    rel_path = f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+    dest = os.path.join(UPLOAD_DIR, rel_path)
+    if os.path.exists(dest):
+        # Same bytes already stored: keep the existing blob
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)
+    return rel_path
+
+def store_stream(stream, filename):
+    """Stores a file-like object and returns its path relative to UPLOAD_DIR."""
+    _ensure_dirs()
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=WORK_DIR, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            _copy_stream(stream, out, MAX_UPLOAD_BYTES, digest)
+        return _commit_blob(tmp_path, digest.hexdigest(), _extension(filename))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# --- RESUMABLE SESSIONS ---
+def _session_paths(upload_id):
+    if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+        raise UploadError("Unknown upload")
+    base = os.path.join(WORK_DIR, upload_id)
+    return base + '.json', base + '.part'
+
+def _load_session(upload_id, user_id):
+    meta_path, part_path = _session_paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise UploadError("Unknown upload")
+    if meta['user_id'] != user_id:
+        raise UploadError("Unknown upload")
+    meta['offset'] = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    return meta, meta_path, part_path
+
+def _purge_stale_sessions():
+    cutoff = time.time() - SESSION_MAX_AGE
+    for name in os.listdir(WORK_DIR):
+        path = os.path.join(WORK_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def start_session(user_id, filename, size):
+    if size <= 0 or size > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f"File must be between 1 byte and {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    _ensure_dirs()
+    _purge_stale_sessions()
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _session_paths(upload_id)
+    with open(meta_path, 'w') as f:
+        json.dump({"user_id": user_id, "filename": filename, "size": size, "created": time.time()}, f)
+    open(part_path, 'wb').close()
+    return {"upload_id": upload_id, "offset": 0, "size": size, "chunk_size": CHUNK_SIZE * 16}
+
+def session_status(upload_id, user_id):
+    meta, _, _ = _load_session(upload_id, user_id)
+    return {"upload_id": upload_id, "offset": meta['offset'], "size": meta['size']}
+
+def append_chunk(upload_id, user_id, offset, stream):
+    """Appends a chunk that starts at `offset`. A mismatched offset (e.g. a retried
+    chunk that already arrived) is rejected and the caller resumes from the
+    returned server offset."""
+    meta, _, part_path = _load_session(upload_id, user_id)
+    if offset != meta['offset']:
+        return False, meta['offset']
+    # Written at `offset` rather than appended: a resent chunk that passes the offset
+    # check while the first copy is still being written lands on the same bytes
+    # instead of being appended after them
+    try:
+        out = open(part_path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError("Unknown upload")
+    with out:
+        out.seek(offset)
+        try:
+            written = _copy_stream(stream, out, meta['size'] - offset)
+        except Exception:
+            # Drop the partial chunk so the client can simply resend it
+            out.truncate(offset)
+            raise
+    return True, offset + written
+
+def finish_session(upload_id, user_id):
+    meta, meta_path, part_path = _load_session(upload_id, user_id)
+    if meta['offset'] != meta['size']:
+        raise UploadError(f"Upload incomplete ({meta['offset']} of {meta['size']} bytes)")
+    digest = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    rel_path = _commit_blob(part_path, digest.hexdigest(), _extension(meta['filename']))
+    os.remove(meta_path)
+    return rel_path